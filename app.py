@@ -1,10 +1,12 @@
 import streamlit as st
-import os
 from health_analyzer import HealthAnalyzer
 from file_processor import FileProcessor
 from auth_manager import AuthManager
 from health_tracker import HealthTracker
-import tempfile
+from blob_store import BlobStore
+from archive import Archiver
+import batch_ingest
+from id_generator import new_id
 import json
 from datetime import datetime, timedelta
 import pandas as pd
@@ -22,12 +24,51 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Session collections persisted by save_user_data, keyed by health data section;
+# reports are not one of them: they are written to storage as they are added
+SESSION_SECTIONS = ('prescriptions', 'appointments')
+
+# Most recent reports held in the session; totals and older pages come from storage
+SESSION_REPORTS = 50
+
+# Dashboard trend charts only cover reports from this many recent days
+TREND_WINDOW_DAYS = 365
+
+# Reports per page of the health history timeline
+HISTORY_PAGE_SIZE = 20
+
+# Archived symptoms shown per "Load older" click
+ARCHIVE_PAGE_SIZE = 10
+
+@st.cache_resource
+def get_auth_manager():
+    """The process-wide AuthManager every browser session shares"""
+    auth_manager = AuthManager()
+    auth_manager.start_schema_sweep()
+    return auth_manager
+
+@st.cache_resource
+def get_archiver():
+    """The process-wide archiver moving old tracking items to cold storage"""
+    archiver = Archiver(get_auth_manager())
+    archiver.start_background_sweep()
+    return archiver
+
+@st.cache_resource
+def get_blob_store():
+    """The process-wide report text blob store"""
+    return BlobStore()
+
 def main():
-    # Initialize authentication manager
+    # Initialize authentication manager, shared by all sessions in this process
     if 'auth_manager' not in st.session_state:
-        st.session_state.auth_manager = AuthManager()
+        st.session_state.auth_manager = get_auth_manager()
     if 'health_tracker' not in st.session_state:
         st.session_state.health_tracker = HealthTracker()
+    if 'blob_store' not in st.session_state:
+        st.session_state.blob_store = get_blob_store()
+    if 'archiver' not in st.session_state:
+        st.session_state.archiver = get_archiver()
     if 'authenticated' not in st.session_state:
         st.session_state.authenticated = False
     if 'current_user' not in st.session_state:
@@ -55,7 +96,7 @@ def main():
     if 'file_upload_counter' not in st.session_state:
         st.session_state.file_upload_counter = 0
     if 'session_id' not in st.session_state:
-        st.session_state.session_id = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        st.session_state.session_id = new_id('session')
     if 'prescriptions' not in st.session_state:
         st.session_state.prescriptions = []
     if 'user_location' not in st.session_state:
@@ -93,6 +134,7 @@ def main():
             save_user_data()
             st.session_state.authenticated = False
             st.session_state.current_user = None
+            st.session_state.loaded_user = None
             st.rerun()
         
         st.markdown("---")
@@ -154,13 +196,13 @@ def main():
         st.subheader("📊 Quick Stats")
         col1, col2 = st.columns(2)
         with col1:
-            st.metric("📄 Reports", len(st.session_state.reports_history))
+            st.metric("📄 Reports", report_totals()['reports'])
         with col2:
-            recent_reports = len([r for r in st.session_state.reports_history if r.get('date', '').startswith(datetime.now().strftime('%Y-%m'))])
+            recent_reports = len(query_reports(start=month_start()))
             st.metric("📅 This Month", recent_reports)
         
         # Health Score with trend
-        health_score, trend = calculate_health_score(st.session_state.reports_history)
+        health_score, trend = calculate_health_score(report_totals(), st.session_state.reports_history[-2:])
         trend_icon = "📈" if trend == "up" else "📉" if trend == "down" else "📊"
         st.metric(f"{trend_icon} Health Score", f"{health_score}%", delta=trend.capitalize() if trend != "neutral" else "Stable")
         
@@ -199,15 +241,13 @@ def main():
     elif st.session_state.current_page == 'history':
         show_history_page()
     
-def calculate_health_score(reports_history):
-    """Calculate health score based on reports and concerns"""
-    if not reports_history:
+def calculate_health_score(totals, recent_reports):
+    """Calculate health score from report totals and the latest two reports"""
+    total_reports = totals['reports']
+    total_concerns = totals['concerns']
+    if not total_reports:
         return 85, "neutral"  # Default score for new users
     
-    # Base score calculation
-    total_reports = len(reports_history)
-    total_concerns = sum(len(r.get('concerns', [])) for r in reports_history)
-    
     # Calculate base score (higher is better)
     if total_concerns == 0:
         base_score = 95
@@ -219,15 +259,13 @@ def calculate_health_score(reports_history):
         base_score = 55
     
     # Calculate trend if we have multiple reports
-    if len(reports_history) >= 2:
-        # Compare recent vs older reports
-        recent_reports = reports_history[-2:]  # Last 2 reports
-        older_reports = reports_history[:-2] if len(reports_history) > 2 else []
+    if total_reports >= 2 and len(recent_reports) == 2:
+        # Compare the last 2 reports with all older ones, whose counts follow from the totals
+        recent_concerns = sum(len(r['concerns']) for r in recent_reports)
+        recent_concern_rate = recent_concerns / len(recent_reports)
         
-        recent_concern_rate = sum(len(r.get('concerns', [])) for r in recent_reports) / len(recent_reports)
-        
-        if older_reports:
-            older_concern_rate = sum(len(r.get('concerns', [])) for r in older_reports) / len(older_reports)
+        if total_reports > 2:
+            older_concern_rate = (total_concerns - recent_concerns) / (total_reports - 2)
             
             if recent_concern_rate < older_concern_rate:
                 trend = "up"
@@ -256,7 +294,7 @@ def process_ai_question(question):
     context = ""
     if st.session_state.reports_history:
         context = "Based on your health reports:\n"
-        for report in st.session_state.reports_history[-3:]:  # Last 3 reports
+        for report in reversed(query_reports(limit=3, newest_first=True)):  # Last 3 reports
             context += f"\nReport: {report['filename']}\n"
             context += f"Summary: {report['summary']}\n"
             if report['concerns']:
@@ -326,11 +364,11 @@ def show_dashboard():
     col1, col2, col3, col4 = st.columns(4)
     
     # Calculate metrics
-    total_reports = len(st.session_state.reports_history)
-    recent_reports = len([r for r in st.session_state.reports_history 
-                         if r.get('date', '').startswith(datetime.now().strftime('%Y-%m'))])
-    concerns = sum(len(r.get('concerns', [])) for r in st.session_state.reports_history)
-    health_score, trend = calculate_health_score(st.session_state.reports_history)
+    totals = report_totals()
+    total_reports = totals['reports']
+    recent_reports = len(query_reports(start=month_start()))
+    concerns = totals['concerns']
+    health_score, trend = calculate_health_score(totals, st.session_state.reports_history[-2:])
     
     with col1:
         st.markdown("""
@@ -379,27 +417,24 @@ def show_dashboard():
     # Health Score Visualization - Fixed height container
     st.markdown("### 📊 Health Score Trends")
     
+    # Only the reports inside the trend window are fetched
+    trend_reports = query_reports(start=datetime.now(pytz.utc) - timedelta(days=TREND_WINDOW_DAYS))
+    
     # Create a fixed height container for consistent layout
     with st.container():
-        if st.session_state.reports_history and len(st.session_state.reports_history) > 1:
+        if len(trend_reports) > 1:
             col1, col2 = st.columns([2, 1])
             
             with col1:
                 # Calculate scores for each report using user-provided dates
                 scores = []
                 dates = []
-                for i, report in enumerate(st.session_state.reports_history):
-                    subset = st.session_state.reports_history[:i+1]
+                for i, report in enumerate(trend_reports):
+                    subset = trend_reports[:i+1]
                     score, _ = calculate_health_score(subset)
                     scores.append(score)
                     
-                    # Use datetime_obj if available, otherwise parse from date string
-                    if 'datetime_obj' in report:
-                        dates.append(report['datetime_obj'].strftime('%Y-%m-%d'))
-                    else:
-                        # Fallback for older records
-                        date_str = report['date'][:10] if len(report['date']) >= 10 else report['date']
-                        dates.append(date_str)
+                    dates.append(report['datetime_obj'].strftime('%Y-%m-%d'))
                 
                 # Create trend chart with fixed height
                 trend_data = pd.DataFrame({
@@ -480,23 +515,20 @@ def show_dashboard():
         st.markdown("---")
     
     # Key Metrics Trends
-    if st.session_state.reports_history and len(st.session_state.reports_history) > 1:
+    if len(trend_reports) > 1:
         st.markdown("### 📈 Key Metrics Trends")
         
         # Extract all unique metric names
         all_metrics = {}
-        for report in st.session_state.reports_history:
-            if 'metrics' in report and report['metrics']:
+        for report in trend_reports:
+            if report['metrics']:
                 for metric in report['metrics']:
                     metric_name = metric.get('name', 'Unknown')
                     if metric_name not in all_metrics:
                         all_metrics[metric_name] = []
                     
                     # Get the date for this report
-                    if 'datetime_obj' in report:
-                        metric_date = report['datetime_obj'].strftime('%Y-%m-%d')
-                    else:
-                        metric_date = report['date'][:10] if len(report['date']) >= 10 else report['date']
+                    metric_date = report['datetime_obj'].strftime('%Y-%m-%d')
                     
                     # Extract numeric value if possible
                     value_str = str(metric.get('value', ''))
@@ -567,11 +599,10 @@ def show_dashboard():
         st.subheader("📈 Recent Analysis")
         if st.session_state.reports_history:
             # Show last 5 reports
-            recent = st.session_state.reports_history[-5:]
-            for report in reversed(recent):
-                with st.expander(f"📄 {report.get('filename', 'Unknown')} - {report.get('date', 'Unknown date')}"):
-                    st.write(f"**Summary:** {report.get('summary', 'No summary available')[:200]}...")
-                    if report.get('concerns'):
+            for report in query_reports(limit=5, newest_first=True):
+                with st.expander(f"📄 {report['filename']} - {report['date']}"):
+                    st.write(f"**Summary:** {report['summary'][:200]}...")
+                    if report['concerns']:
                         st.warning(f"Concerns: {len(report['concerns'])} items flagged")
         else:
             st.info("No reports analyzed yet. Upload your first health report to get started!")
@@ -599,13 +630,13 @@ def show_dashboard():
         
         # Show medical report insights
         if st.session_state.reports_history:
-            latest_report = st.session_state.reports_history[-1]
-            if latest_report.get('metrics'):
+            latest_report = query_reports(limit=1, newest_first=True)[0]
+            if latest_report['metrics']:
                 st.write("**Latest Medical Metrics:**")
                 for metric in latest_report['metrics'][:2]:  # Show top 2 metrics
                     st.write(f"• {metric.get('name', 'Unknown')}: {metric.get('value', 'N/A')}")
             
-            if latest_report.get('concerns'):
+            if latest_report['concerns']:
                 st.write("**Medical Concerns:**")
                 for concern in latest_report['concerns'][:2]:  # Show top 2 concerns
                     st.warning(f"⚠️ {concern}")
@@ -648,10 +679,11 @@ def show_upload_page():
     col1, col2 = st.columns([2, 1])
     
     with col1:
-        uploaded_file = st.file_uploader(
-            "Choose a file",
-            type=['pdf', 'txt', 'png', 'jpg', 'jpeg', 'bmp', 'tiff'],
-            help="Upload your medical report in PDF, image, or text format"
+        uploaded_files = st.file_uploader(
+            "Choose files",
+            type=['pdf', 'txt', 'png', 'jpg', 'jpeg', 'bmp', 'tiff', 'tif', 'gif'],
+            accept_multiple_files=True,
+            help="Upload one or more medical reports in PDF, image, or text format"
         )
     
     with col2:
@@ -671,6 +703,14 @@ def show_upload_page():
             help="Select the time of this health report"
         )
     
+    if uploaded_files and len(uploaded_files) > 1:
+        st.info(f"**{len(uploaded_files)} files selected** ({sum(f.size for f in uploaded_files) / 1024:.1f} KB); "
+                "all will be filed with the report date above")
+        if st.button(f"🔍 Analyze {len(uploaded_files)} Reports", type="primary"):
+            run_batch_upload(uploaded_files, report_date, report_time)
+        return
+    
+    uploaded_file = uploaded_files[0] if uploaded_files else None
     if uploaded_file is not None:
         # Display file info
         col1, col2 = st.columns(2)
@@ -683,50 +723,85 @@ def show_upload_page():
         
         # Process file button
         if st.button("🔍 Analyze Report", type="primary"):
-            tmp_file_path = None
             try:
                 with st.spinner("Processing your health report..."):
-                    # Save uploaded file temporarily
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=f".{uploaded_file.name.split('.')[-1]}") as tmp_file:
-                        tmp_file.write(uploaded_file.getvalue())
-                        tmp_file_path = tmp_file.name
-                    
-                    # Extract text from file
+                    # Extract text page by page; extraction fills the bar up to 80%
                     progress_bar = st.progress(0)
-                    st.text("Extracting text from document...")
+                    status = st.empty()
+                    status.text("Extracting text from document...")
                     
-                    extracted_text = st.session_state.file_processor.extract_text(tmp_file_path, uploaded_file.type)
-                    progress_bar.progress(50)
+                    # The upload is read in place from memory; nothing is written to disk
+                    file_processor = st.session_state.file_processor
+                    page_count = file_processor.page_count(uploaded_file, uploaded_file.type, uploaded_file.name)
+                    pages = []
+                    for page_number, page_text, timings in file_processor.iter_pages(uploaded_file, uploaded_file.type, uploaded_file.name):
+                        pages.append(page_text)
+                        progress_bar.progress(int(80 * page_number / max(page_count, 1)))
+                        status.text(f"Extracted page {page_number} of {page_count} ({timings['elapsed']:.1f}s)")
+                    extracted_text = "\n".join(pages).strip()
                     
                     if not extracted_text.strip():
                         st.error("❌ Could not extract text from the uploaded file. Please ensure the file contains readable text or try a different format.")
-                        if tmp_file_path:
-                            os.unlink(tmp_file_path)
                         return
                     
-                    st.text("Analyzing health data with AI...")
+                    status.text("Analyzing health data with AI...")
                     
                     # Analyze with AI
                     analysis_result = st.session_state.health_analyzer.analyze_health_report(extracted_text)
                     progress_bar.progress(100)
                     
-                    # Clean up temporary file
-                    if tmp_file_path:
-                        os.unlink(tmp_file_path)
-                    
                     # Display results
                     display_analysis_results(analysis_result, extracted_text, uploaded_file.name, report_date, report_time)
                     
             except Exception as e:
                 st.error(f"❌ Error processing file: {str(e)}")
-                if tmp_file_path:
-                    try:
-                        os.unlink(tmp_file_path)
-                    except:
-                        pass
 
-def display_analysis_results(analysis_result, extracted_text, filename, report_date=None, report_time=None):
-    """Display the analysis results in a structured format"""
+def run_batch_upload(uploaded_files, report_date, report_time):
+    """Extract and analyze several uploads concurrently, then file every report in one write"""
+    status_icons = {
+        batch_ingest.QUEUED: "⏳", batch_ingest.EXTRACTING: "📄", batch_ingest.ANALYZING: "🤖",
+        batch_ingest.DONE: "✅", batch_ingest.FAILED: "❌"
+    }
+    items = [batch_ingest.BatchItem(f, f.name, f.type) for f in uploaded_files]
+    progress_bar = st.progress(0)
+    rows = {}
+    for item in items:
+        rows[id(item)] = st.empty()
+        rows[id(item)].text(f"{status_icons[item.status]} {item.name}: {item.status}")
+    
+    finished = 0
+    for item, status in batch_ingest.process_batch(items, st.session_state.file_processor, st.session_state.health_analyzer):
+        detail = status
+        if status in (batch_ingest.DONE, batch_ingest.FAILED):
+            finished += 1
+            progress_bar.progress(min(100, int(100 * finished / len(items))))
+            detail = f"{item.error} ({item.seconds:.1f}s)" if status == batch_ingest.FAILED else f"done in {item.seconds:.1f}s"
+        rows[id(item)].text(f"{status_icons[status]} {item.name}: {detail}")
+    
+    reports = [
+        build_report_record(item.analysis, item.text, item.name, report_date, report_time)
+        for item in items if item.status == batch_ingest.DONE
+    ]
+    if not reports:
+        st.error("❌ None of the files could be analyzed.")
+        return
+    
+    # One storage write for the whole batch
+    st.session_state.user_view.add_many('reports', reports)
+    remember_reports(reports)
+    st.session_state.last_analysis = reports[-1]
+    
+    failed = len(items) - len(reports)
+    st.success(f"✅ Analyzed {len(reports)} reports" + (f"; {failed} failed" if failed else ""))
+    for report in reports:
+        with st.expander(f"📄 {report['filename']}"):
+            st.markdown(report['summary'])
+            for concern in report['concerns']:
+                st.warning(f"⚠️ {concern}")
+
+
+def build_report_record(analysis_result, extracted_text, filename, report_date=None, report_time=None):
+    """Report record for an analysis, its text stored in the blob store"""
     
     # Save to history with user-provided date and EST timezone
     est_tz = pytz.timezone('US/Eastern')
@@ -746,7 +821,7 @@ def display_analysis_results(analysis_result, extracted_text, filename, report_d
         datetime_obj = current_est
     
     report_data = {
-        'id': f"report_{len(st.session_state.reports_history) + 1}_{datetime_obj.strftime('%Y%m%d_%H%M%S')}",
+        'id': new_id('report'),
         'filename': filename,
         'date': formatted_date,
         'datetime_obj': datetime_obj,
@@ -754,10 +829,20 @@ def display_analysis_results(analysis_result, extracted_text, filename, report_d
         'concerns': analysis_result.get('concerns', []),
         'recommendations': analysis_result.get('recommendations', []),
         'metrics': analysis_result.get('metrics', []),
-        'extracted_text': extracted_text,
+        # Only the hash is kept; the text lives in the blob store until needed
+        'extracted_text_hash': st.session_state.blob_store.put(extracted_text),
         'downloaded': False
     }
-    st.session_state.reports_history.append(report_data)
+    return report_data
+
+
+def display_analysis_results(analysis_result, extracted_text, filename, report_date=None, report_time=None):
+    """Display the analysis results in a structured format"""
+    
+    report_data = build_report_record(analysis_result, extracted_text, filename, report_date, report_time)
+    remember_reports([report_data])
+    # Stored right away so the time index sees it; nothing left to save for 'reports'
+    st.session_state.user_view.add('reports', report_data)
     st.session_state.last_analysis = report_data
     
     st.success("✅ Analysis Complete!")
@@ -858,7 +943,7 @@ Disclaimer: This analysis is for informational purposes only and should not repl
     st.header("📚 Upload History")
     
     if st.session_state.reports_history:
-        st.info(f"You have analyzed {len(st.session_state.reports_history)} reports so far.")
+        st.info(f"You have analyzed {report_totals()['reports']} reports so far.")
         
         # Show last 10 uploaded files
         recent_uploads = st.session_state.reports_history[-10:]
@@ -916,10 +1001,15 @@ Disclaimer: This analysis is for informational purposes only and should not repl
             mime="text/plain",
             key=f"download_{report_data['id']}"
         ):
-            # Mark as downloaded but keep button visible
-            for report in st.session_state.reports_history:
+            # Mark as downloaded but keep button visible; the record is shared, so it is replaced by a copy
+            st.session_state.auth_manager.update_health_item(
+                st.session_state.current_user, 'reports', report_data['id'],
+                lambda report: report.update(downloaded=True)
+            )
+            reports_history = st.session_state.reports_history
+            for index, report in enumerate(reports_history):
                 if report['id'] == report_data['id']:
-                    report['downloaded'] = True
+                    report_data = reports_history[index] = {**report, 'downloaded': True}
     
     with col2:
         if report_data.get('downloaded', False):
@@ -927,6 +1017,13 @@ Disclaimer: This analysis is for informational purposes only and should not repl
         st.info("💡 Download stays available")
 
 
+def load_report_text(report):
+    """Return a report's extracted text, fetching it from the blob store"""
+    if report['extracted_text_hash'] is None:
+        return ''
+    return st.session_state.blob_store.get(report['extracted_text_hash']) or ''
+
+
 def show_summary_page():
     """Report summary page"""
     st.title("📈 Report Summary")
@@ -942,11 +1039,12 @@ def show_summary_page():
     # Summary Statistics
     col1, col2, col3 = st.columns(3)
     
-    total_concerns = sum(len(r.get('concerns', [])) for r in st.session_state.reports_history)
-    total_recommendations = sum(len(r.get('recommendations', [])) for r in st.session_state.reports_history)
+    totals = report_totals()
+    total_concerns = totals['concerns']
+    total_recommendations = totals['recommendations']
     
     with col1:
-        st.metric("Total Reports", len(st.session_state.reports_history))
+        st.metric("Total Reports", totals['reports'])
     with col2:
         st.metric("Total Concerns", total_concerns)
     with col3:
@@ -957,7 +1055,18 @@ def show_summary_page():
     # Detailed Report List
     st.subheader("📊 All Reports")
     
-    for i, report in enumerate(reversed(st.session_state.reports_history)):
+    # Newest first, one page at a time, as on the history page
+    if 'summary_pages' not in st.session_state or st.session_state.summary_pages[0] != st.session_state.current_user:
+        st.session_state.summary_pages = (st.session_state.current_user, 1)
+    summary_reports = []
+    cursor = None
+    for _ in range(st.session_state.summary_pages[1]):
+        page, cursor = query_reports(limit=HISTORY_PAGE_SIZE, cursor=cursor, newest_first=True, with_cursor=True)
+        summary_reports.extend(page)
+        if cursor is None:
+            break
+    
+    for i, report in enumerate(summary_reports):
         with st.expander(f"📄 {report['filename']} - {report['date']}"):
             col1, col2 = st.columns([2, 1])
             
@@ -982,6 +1091,20 @@ def show_summary_page():
                         st.write(f"**{metric.get('name', 'Unknown')}:** {metric.get('value', 'N/A')}")
                 else:
                     st.write("No specific metrics extracted")
+            
+            # Extracted text is loaded from the blob store only when asked for
+            if st.checkbox("📄 Show extracted text", key=f"show_text_{report['id']}"):
+                st.text_area(
+                    "Raw extracted text:",
+                    value=load_report_text(report),
+                    height=200,
+                    disabled=True,
+                    key=f"text_{report['id']}"
+                )
+    
+    if cursor is not None and st.button("⬇️ Load older reports", key="summary_load_older"):
+        st.session_state.summary_pages = (st.session_state.current_user, st.session_state.summary_pages[1] + 1)
+        st.rerun()
 
 def show_assistant_page():
     """Query assistant page"""
@@ -1061,8 +1184,16 @@ def show_history_page():
     # Timeline view
     st.subheader("📈 Health Timeline")
     
-    # Sort reports by date
-    sorted_reports = sorted(st.session_state.reports_history, key=lambda x: x['date'], reverse=True)
+    # Newest first, one page at a time; "Load older" follows the storage cursor
+    if 'history_pages' not in st.session_state or st.session_state.history_pages[0] != st.session_state.current_user:
+        st.session_state.history_pages = (st.session_state.current_user, 1)
+    sorted_reports = []
+    cursor = None
+    for _ in range(st.session_state.history_pages[1]):
+        page, cursor = query_reports(limit=HISTORY_PAGE_SIZE, cursor=cursor, newest_first=True, with_cursor=True)
+        sorted_reports.extend(page)
+        if cursor is None:
+            break
     
     for report in sorted_reports:
         with st.container():
@@ -1074,7 +1205,7 @@ def show_history_page():
             
             with col2:
                 # Health status indicator
-                concern_count = len(report.get('concerns', []))
+                concern_count = len(report['concerns'])
                 if concern_count == 0:
                     st.success("✅ No concerns identified")
                 elif concern_count <= 2:
@@ -1094,6 +1225,10 @@ def show_history_page():
             
             st.markdown("---")
     
+    if cursor is not None and st.button("⬇️ Load older reports", key="history_load_older"):
+        st.session_state.history_pages = (st.session_state.current_user, st.session_state.history_pages[1] + 1)
+        st.rerun()
+    
     # Health trends (if multiple reports)
     if len(sorted_reports) > 1:
         st.subheader("📊 Health Trends")
@@ -1102,7 +1237,7 @@ def show_history_page():
         
         with col1:
             st.markdown("**Concern Trends:**")
-            concern_counts = [len(r.get('concerns', [])) for r in reversed(sorted_reports)]
+            concern_counts = [len(r['concerns']) for r in reversed(sorted_reports)]
             dates = [r['date'][:10] for r in reversed(sorted_reports)]  # Just date part
             
             if concern_counts:
@@ -1118,7 +1253,7 @@ def show_history_page():
             # Most common concerns
             all_concerns = []
             for report in sorted_reports:
-                all_concerns.extend(report.get('concerns', []))
+                all_concerns.extend(report['concerns'])
             
             if all_concerns:
                 concern_counts = {}
@@ -1208,7 +1343,7 @@ def show_prescription_management():
                 medicine_info = get_dailymed_info(medicine_name)
                 
                 prescription = {
-                    'id': f"rx_{len(st.session_state.prescriptions) + 1}",
+                    'id': new_id('rx'),
                     'medicine_name': medicine_name,
                     'dosage': dosage,
                     'frequency': frequency,
@@ -1220,6 +1355,7 @@ def show_prescription_management():
                 }
                 
                 st.session_state.prescriptions.append(prescription)
+                mark_dirty('prescriptions')
                 st.success(f"✅ Added {medicine_name} to your medications!")
                 st.rerun()
             else:
@@ -1255,6 +1391,7 @@ def show_prescription_management():
                 with col3:
                     if st.button(f"🗑️ Remove", key=f"remove_{i}"):
                         st.session_state.prescriptions.pop(i)
+                        mark_dirty('prescriptions')
                         st.success("Medication removed!")
                         st.rerun()
                     
@@ -1456,7 +1593,7 @@ def show_appointment_booking():
         if st.button("📅 Submit Appointment Request", type="primary"):
             if appointment_type and appointment_date and contact_number:
                 appointment_request = {
-                    'id': f"appt_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+                    'id': new_id('appt'),
                     'type': appointment_type,
                     'preferred_doctor': preferred_doctor,
                     'date': appointment_date.strftime('%Y-%m-%d'),
@@ -1474,6 +1611,7 @@ def show_appointment_booking():
                     st.session_state.appointments = []
                 
                 st.session_state.appointments.append(appointment_request)
+                mark_dirty('appointments')
                 
                 st.success("✅ Appointment request submitted successfully!")
                 st.info("📧 You will receive a confirmation call/email within 24 hours.")
@@ -1525,6 +1663,7 @@ def show_appointment_booking():
                     
                     if st.button(f"❌ Cancel", key=f"cancel_appt_{i}"):
                         st.session_state.appointments.pop(i)
+                        mark_dirty('appointments')
                         st.success("Appointment cancelled!")
                         st.rerun()
                 
@@ -1786,7 +1925,7 @@ def show_appointments_page():
         if st.button("📋 Submit Appointment Request", type="primary"):
             if patient_name and patient_phone:
                 appointment = {
-                    'id': f"appt_{len(st.session_state.appointments) + 1}",
+                    'id': new_id('appt'),
                     'hospital': hospital['name'],
                     'hospital_address': hospital['address'],
                     'hospital_phone': 'Contact provided after confirmation',
@@ -1803,6 +1942,7 @@ def show_appointments_page():
                 }
                 
                 st.session_state.appointments.append(appointment)
+                mark_dirty('appointments')
                 st.success("✅ Appointment request submitted successfully!")
                 st.info("The hospital will contact you within 24-48 hours to confirm your appointment.")
                 
@@ -2542,23 +2682,73 @@ def show_login_page():
 def load_user_data():
     """Load user-specific health data from auth manager"""
     username = st.session_state.current_user
-    if username:
-        health_data = st.session_state.auth_manager.get_user_health_data(username)
-        if health_data:
-            st.session_state.reports_history = health_data.get('reports', [])
-            st.session_state.prescriptions = health_data.get('prescriptions', [])
-            st.session_state.appointments = health_data.get('appointments', [])
+    # Storage engines may hand out copies, so only reload when the user changes;
+    # reloading on every rerun would drop session edits not yet saved
+    if username and st.session_state.get('loaded_user') != username:
+        st.session_state.loaded_user = username
+        # Trim the live record before this session starts reading it
+        st.session_state.archiver.archive_user(username)
+        st.session_state.user_view = st.session_state.auth_manager.session_view(username)
+        # Session-owned lists over the shared records, so session appends
+        # never alias the storage engine's or another session's
+        sections = st.session_state.user_view.sections(SESSION_SECTIONS)
+        # Only the latest reports, oldest first; pages read older ones through query_reports
+        st.session_state.reports_history = list(reversed(query_reports(limit=SESSION_REPORTS, newest_first=True)))
+        st.session_state.prescriptions = sections['prescriptions']
+        st.session_state.appointments = sections['appointments']
+        st.session_state.section_versions = {section: 0 for section in SESSION_SECTIONS}
+        st.session_state.saved_versions = dict(st.session_state.section_versions)
+
+def query_reports(start=None, end=None, limit=None, cursor=None, newest_first=False, with_cursor=False):
+    """Window of the current user's reports, read through the storage time index"""
+    reports, next_cursor = st.session_state.user_view.query_reports(
+        start=start, end=end, limit=limit, cursor=cursor, newest_first=newest_first
+    )
+    if with_cursor:
+        return reports, next_cursor
+    return reports
+
+def month_start():
+    """Midnight on the first of the current month, US Eastern"""
+    est_tz = pytz.timezone('US/Eastern')
+    return est_tz.localize(datetime.now(est_tz).replace(day=1, hour=0, minute=0, second=0, microsecond=0, tzinfo=None))
+
+def report_totals():
+    """Report, concern and recommendation counts over all of the current user's reports"""
+    return st.session_state.user_view.report_totals()
+
+def remember_reports(reports):
+    """Add newly stored reports to the session's window of recent ones"""
+    reports_history = st.session_state.reports_history
+    reports_history.extend(reports)
+    del reports_history[:-SESSION_REPORTS]
+
+def mark_dirty(section):
+    """Bump the version of a session collection after mutating it"""
+    versions = st.session_state.setdefault('section_versions', {})
+    versions[section] = versions.get(section, 0) + 1
 
 def save_user_data():
-    """Save user-specific health data to auth manager"""
+    """Save user-specific health data to auth manager, skipping unchanged sections"""
     username = st.session_state.current_user
     if username:
+        versions = st.session_state.get('section_versions', {})
+        saved = st.session_state.setdefault('saved_versions', {})
+        dirty_sections = {
+            section for section in SESSION_SECTIONS
+            if versions.get(section, 0) != saved.get(section, 0)
+        }
+        if not dirty_sections:
+            # Counted, so skipped_writes covers clean reruns too
+            st.session_state.user_view.skip_save(SESSION_SECTIONS)
+            return
+        # Copies, for the same aliasing reason as in load_user_data
         health_data = {
-            'reports': st.session_state.get('reports_history', []),
-            'prescriptions': st.session_state.get('prescriptions', []),
-            'appointments': st.session_state.get('appointments', [])
+            'prescriptions': list(st.session_state.get('prescriptions', [])),
+            'appointments': list(st.session_state.get('appointments', []))
         }
-        st.session_state.auth_manager.update_user_health_data(username, health_data)
+        st.session_state.user_view.save(health_data, dirty_sections)
+        saved.update({section: versions.get(section, 0) for section in dirty_sections})
 
 def show_health_tracking_page():
     """Health tracking page with medication reminders, goals, and symptom tracker"""
@@ -2631,21 +2821,30 @@ def show_medication_reminders():
                             st.write(f"**End:** {reminder['end_date']}")
                     
                     with col2:
-                        if reminder.get('history'):
-                            st.write(f"**Last Taken:** {reminder['history'][-1]['taken_at']}")
-                            st.write(f"**Total Doses:** {len(reminder['history'])}")
+                        archived = reminder['history_archived']
+                        if reminder['history'] or archived:
+                            last_taken = reminder['history'][-1]['taken_at'] if reminder['history'] else archived['last_taken_at']
+                            total_doses = len(reminder['history']) + (archived['count'] if archived else 0)
+                            st.write(f"**Last Taken:** {last_taken}")
+                            st.write(f"**Total Doses:** {total_doses}")
                         else:
                             st.write("**Status:** Not yet taken")
                     
                     with col3:
                         if st.button("✅ Mark Taken", key=f"take_{i}"):
-                            st.session_state.health_tracker.log_medication_taken(reminder)
+                            st.session_state.auth_manager.update_health_item(
+                                username, 'medication_reminders', reminder['id'],
+                                st.session_state.health_tracker.log_medication_taken
+                            )
                             save_user_data()  # Save immediately
                             st.success("Logged!")
                             st.rerun()
                         
                         if st.button("🗑️ Delete", key=f"del_rem_{i}"):
-                            reminder['active'] = False
+                            st.session_state.auth_manager.update_health_item(
+                                username, 'medication_reminders', reminder['id'],
+                                lambda item: item.update(active=False)
+                            )
                             save_user_data()  # Save immediately
                             st.success("Reminder removed!")
                             st.rerun()
@@ -2706,13 +2905,21 @@ def show_health_goals():
                             st.write(f"**Notes:** {goal['notes']}")
                     
                     with col2:
-                        if goal.get('progress'):
-                            progress_df = pd.DataFrame(goal['progress'])
+                        progress = goal['progress']
+                        if goal['progress_archived'] and st.checkbox(
+                            f"Include {goal['progress_archived']['count']} archived entries", key=f"goal_archive_{i}"
+                        ):
+                            progress = list(st.session_state.archiver.archive.iter_items(username, f"goal:{goal['id']}")) + progress
+                        if progress:
+                            progress_df = pd.DataFrame(progress)
                             st.line_chart(progress_df.set_index('date')['value'], height=200)
                         
                         new_value = st.number_input(f"Update Progress", min_value=0.0, step=0.1, key=f"goal_{i}")
                         if st.button("📊 Log Progress", key=f"log_goal_{i}"):
-                            st.session_state.health_tracker.update_goal_progress(goal, new_value)
+                            st.session_state.auth_manager.update_health_item(
+                                username, 'health_goals', goal['id'],
+                                lambda item: st.session_state.health_tracker.update_goal_progress(item, new_value)
+                            )
                             save_user_data()  # Save immediately
                             st.success("Progress updated!")
                             st.rerun()
@@ -2725,6 +2932,8 @@ def show_symptom_tracker():
     
     username = st.session_state.current_user
     symptoms = st.session_state.auth_manager.get_user_health_data(username, 'symptoms') or []
+    symptom_rollups = st.session_state.auth_manager.get_user_health_data(username, 'symptom_rollups') or []
+    archived_rollup = symptom_rollups[0] if symptom_rollups else None
     
     # Log new symptom
     with st.expander("➕ Log New Symptom", expanded=True):
@@ -2750,11 +2959,11 @@ def show_symptom_tracker():
                 st.rerun()
     
     # Display symptoms and patterns
-    if symptoms:
+    if symptoms or archived_rollup:
         st.subheader("📋 Symptom History")
         
-        # Analyze patterns
-        analysis = st.session_state.health_tracker.analyze_symptom_patterns(symptoms)
+        # Analyze patterns, archived symptoms included through their rollup
+        analysis = st.session_state.health_tracker.analyze_symptom_patterns(symptoms, archived_rollup)
         
         if analysis['insights']:
             st.warning("⚠️ **AI Pattern Detection:**")
@@ -2762,8 +2971,15 @@ def show_symptom_tracker():
                 st.write(f"• {insight}")
             st.markdown("---")
         
-        # Show recent symptoms
-        for symptom in reversed(symptoms[-10:]):  # Last 10 symptoms
+        # Show recent symptoms, then whatever pages of the archive were requested
+        shown = list(reversed(symptoms[-10:]))  # Last 10 symptoms
+        archive_pages = st.session_state.get('symptom_archive_pages', 0)
+        if archive_pages:
+            shown.extend(reversed(symptoms[:-10]))
+            shown.extend(st.session_state.archiver.archive.page(
+                username, 'symptoms', limit=archive_pages * ARCHIVE_PAGE_SIZE
+            ))
+        for symptom in shown:
             severity_color = "🔴" if symptom['severity'] == 'severe' else "🟡" if symptom['severity'] == 'moderate' else "🟢"
             with st.expander(f"{severity_color} {symptom['symptom_name']} - {symptom['logged_at']}", expanded=False):
                 st.write(f"**Severity:** {symptom['severity'].title()}")
@@ -2773,6 +2989,12 @@ def show_symptom_tracker():
                     st.write(f"**Description:** {symptom['description']}")
                 if symptom.get('triggers'):
                     st.write(f"**Triggers:** {symptom['triggers']}")
+        
+        archived_count = archived_rollup['count'] if archived_rollup else 0
+        if archive_pages * ARCHIVE_PAGE_SIZE < archived_count:
+            if st.button(f"📦 Load older symptoms ({archived_count} archived)", key="symptom_archive_more"):
+                st.session_state.symptom_archive_pages = archive_pages + 1
+                st.rerun()
     else:
         st.info("No symptoms logged yet. Track your symptoms above!")
 
@@ -2789,8 +3011,8 @@ def show_family_page():
     # Display family code
     st.info(f"**Your Family Code:** `{family_id}` - Share this with family members to join!")
     
-    # Get all family members
-    family_members = st.session_state.auth_manager.get_family_members(family_id)
+    # Get all family members with their health summaries in one call
+    family_members = st.session_state.auth_manager.get_family_member_summaries(family_id)
     
     # Add new family member (admin only)
     if is_admin:
@@ -2835,13 +3057,9 @@ def show_family_page():
                 st.write(f"**Username:** {member['username']}")
                 st.write(f"**Role:** {member['role'].title()}")
                 
-                # Show health summary if available
-                member_health = st.session_state.auth_manager.get_user_health_data(member['username'])
-                if member_health:
-                    reports_count = len(member_health.get('reports', []))
-                    prescriptions_count = len(member_health.get('prescriptions', []))
-                    st.write(f"**Health Reports:** {reports_count}")
-                    st.write(f"**Prescriptions:** {prescriptions_count}")
+                # Show health summary
+                st.write(f"**Health Reports:** {member['reports_count']}")
+                st.write(f"**Prescriptions:** {member['prescriptions_count']}")
             
             with col2:
                 if is_admin and not is_current:
@@ -0,0 +1,206 @@
+import gzip
+import hashlib
+import os
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+import record_codec
+
+# Tracking items older than this many days leave the live record
+ARCHIVE_AFTER_DAYS = int(os.getenv('MEDIASSIST_ARCHIVE_AFTER_DAYS', '90'))
+
+# Seconds between background archive passes over every user
+ARCHIVE_SWEEP_INTERVAL = 24 * 60 * 60
+
+# App timestamps are written in US Eastern standard time
+_EST = timezone(timedelta(hours=-5), 'EST')
+
+
+def _item_time(value):
+    """Datetime of an app timestamp ('2025-01-31 09:30 EST' or '2025-01-31'), or None"""
+    if not value:
+        return None
+    for fmt, length in (('%Y-%m-%d %H:%M', 16), ('%Y-%m-%d', 10)):
+        try:
+            return datetime.strptime(value[:length], fmt).replace(tzinfo=_EST)
+        except ValueError:
+            continue
+    return None
+
+
+def _split_old(items, time_field, cutoff):
+    """Split chronologically appended items into (older than cutoff, the rest)"""
+    split = 0
+    for item in items:
+        logged = _item_time(item.get(time_field))
+        if logged is None or logged >= cutoff:
+            break
+        split += 1
+    return items[:split], items[split:]
+
+
+class ColdArchive:
+    """Per-user gzip NDJSON archive of tracking items moved out of live records
+    
+    Each stream (symptoms, one reminder's dose history, one goal's progress)
+    is a file of appended gzip members, oldest items first, so archiving a
+    batch never rewrites what is already there.
+    """
+    
+    def __init__(self, root=None):
+        """Initialize the archive rooted at ``root`` (MEDIASSIST_ARCHIVE_DIR by default)"""
+        self.root = root or os.getenv('MEDIASSIST_ARCHIVE_DIR', 'health_archive')
+        os.makedirs(self.root, exist_ok=True)
+    
+    def _path(self, username, stream):
+        """Archive file of one stream of one user"""
+        user_dir = hashlib.sha256(username.encode()).hexdigest()[:32]
+        stream_name = stream.replace(os.sep, '_').replace(':', '_')
+        return os.path.join(self.root, user_dir, f"{stream_name}.ndjson.gz")
+    
+    def append(self, username, stream, items):
+        """Append items (oldest first) to a stream as one gzip member"""
+        if not items:
+            return
+        path = self._path(username, stream)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = ''.join(record_codec.dumps(item, pretty=False) + '\n' for item in items)
+        with open(path, 'ab') as f:
+            f.write(gzip.compress(data.encode('utf-8')))
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def iter_items(self, username, stream):
+        """Stream archived items oldest first"""
+        path = self._path(username, stream)
+        if not os.path.exists(path):
+            return
+        with gzip.open(path, 'rb') as f:
+            for line in f:
+                yield record_codec.loads(line)
+    
+    def page(self, username, stream, offset=0, limit=20):
+        """Archived items newest first, skipping the ``offset`` newest
+        
+        Memory is bounded by ``offset + limit`` whatever the archive size.
+        """
+        window = deque(self.iter_items(username, stream), maxlen=offset + limit)
+        newest_first = list(reversed(window))
+        return newest_first[offset:offset + limit]
+
+
+class Archiver:
+    """Retention policy moving old tracking items from live records to the cold archive
+    
+    Symptoms, reminder dose history and goal progress older than
+    ``max_age_days`` are archived; the live record keeps the recent items
+    plus rollups (``symptom_rollups``, ``history_archived``,
+    ``progress_archived``) so counts and summaries stay exact.
+    """
+    
+    def __init__(self, manager, archive=None, max_age_days=ARCHIVE_AFTER_DAYS):
+        self.manager = manager
+        self.archive = archive if archive is not None else ColdArchive()
+        self.max_age_days = max_age_days
+    
+    def archive_user(self, username, now=None):
+        """Archive one user's old items; returns how many items moved"""
+        cutoff = (now or datetime.now(_EST)) - timedelta(days=self.max_age_days)
+        self.manager.ensure_current(username)
+        with self.manager.lock.write_locked():
+            health_data = self.manager.storage.get_health_data(username)
+            if health_data is None:
+                return 0
+            changed = {}
+            moved = 0
+            
+            old, recent = _split_old(health_data['symptoms'], 'logged_at', cutoff)
+            if old:
+                self.archive.append(username, 'symptoms', old)
+                rollups = [dict(rollup) for rollup in health_data['symptom_rollups']] or [_empty_symptom_rollup()]
+                _roll_up_symptoms(rollups[0], old)
+                changed['symptoms'] = recent
+                changed['symptom_rollups'] = rollups
+                moved += len(old)
+            
+            reminders = []
+            for reminder in health_data['medication_reminders']:
+                old, recent = _split_old(reminder['history'], 'taken_at', cutoff)
+                if old:
+                    self.archive.append(username, f"reminder:{reminder['id']}", old)
+                    reminder = dict(reminder, history=recent)
+                    reminder['history_archived'] = _roll_up_doses(reminder['history_archived'], old)
+                    moved += len(old)
+                    changed['medication_reminders'] = reminders
+                reminders.append(reminder)
+            
+            goals = []
+            for goal in health_data['health_goals']:
+                old, recent = _split_old(goal['progress'], 'date', cutoff)
+                if old:
+                    self.archive.append(username, f"goal:{goal['id']}", old)
+                    goal = dict(goal, progress=recent)
+                    goal['progress_archived'] = _roll_up_progress(goal['progress_archived'], old)
+                    moved += len(old)
+                    changed['health_goals'] = goals
+                goals.append(goal)
+            
+            if changed:
+                self.manager.storage.update_health_data(username, changed)
+        return moved
+    
+    def start_background_sweep(self, interval=ARCHIVE_SWEEP_INTERVAL):
+        """Run ``archive_user`` over every stored user every ``interval`` seconds on a daemon thread"""
+        stop = threading.Event()
+        
+        def sweep():
+            while not stop.is_set():
+                for user in self.manager.storage.iter_users():
+                    if user is not None:
+                        self.archive_user(user['username'])
+                stop.wait(interval)
+        
+        thread = threading.Thread(target=sweep, name='archive-sweep', daemon=True)
+        thread.start()
+        return stop
+
+
+def _empty_symptom_rollup():
+    """Aggregate of every archived symptom of a user"""
+    return {'count': 0, 'first_logged_at': None, 'last_logged_at': None, 'by_name': {}}
+
+
+def _roll_up_symptoms(rollup, symptoms):
+    """Fold archived symptoms into the symptom rollup in place"""
+    severity_map = {'mild': 1, 'moderate': 2, 'severe': 3}
+    by_name = rollup['by_name'] = dict(rollup['by_name'])
+    for symptom in symptoms:
+        stats = dict(by_name.get(symptom['symptom_name'], {'count': 0, 'severity_sum': 0}))
+        stats['count'] += 1
+        stats['severity_sum'] += severity_map.get(symptom['severity'], 0)
+        by_name[symptom['symptom_name']] = stats
+    rollup['count'] += len(symptoms)
+    rollup['first_logged_at'] = rollup['first_logged_at'] or symptoms[0]['logged_at']
+    rollup['last_logged_at'] = symptoms[-1]['logged_at']
+
+
+def _roll_up_doses(rollup, doses):
+    """Reminder dose history rollup with archived doses folded in"""
+    rollup = dict(rollup or {'count': 0, 'first_taken_at': None, 'last_taken_at': None})
+    rollup['count'] += len(doses)
+    rollup['first_taken_at'] = rollup['first_taken_at'] or doses[0]['taken_at']
+    rollup['last_taken_at'] = doses[-1]['taken_at']
+    return rollup
+
+
+def _roll_up_progress(rollup, progress):
+    """Goal progress rollup with archived entries folded in"""
+    values = [entry['value'] for entry in progress]
+    rollup = dict(rollup or {'count': 0, 'first_date': None, 'last_date': None, 'min': None, 'max': None})
+    rollup['count'] += len(progress)
+    rollup['first_date'] = rollup['first_date'] or progress[0]['date']
+    rollup['last_date'] = progress[-1]['date']
+    rollup['min'] = min(values) if rollup['min'] is None else min(rollup['min'], *values)
+    rollup['max'] = max(values) if rollup['max'] is None else max(rollup['max'], *values)
+    return rollup
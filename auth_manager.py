@@ -1,29 +1,54 @@
-import json
+import copy
 import hashlib
-import os
+import threading
 from datetime import datetime
 import pytz
+import schema
+from rw_lock import ReadWriteLock
+from storage import create_storage
 
 class AuthManager:
-    def __init__(self):
-        """Initialize authentication manager"""
-        self.users_file = 'users_data.json'
-        self.users = self._load_users()
-    
-    def _load_users(self):
-        """Load users from JSON file"""
-        if os.path.exists(self.users_file):
-            try:
-                with open(self.users_file, 'r') as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {}
-    
-    def _save_users(self):
-        """Save users to JSON file"""
-        with open(self.users_file, 'w') as f:
-            json.dump(self.users, f, indent=2)
+    def __init__(self, storage=None):
+        """Initialize authentication manager
+        
+        ``storage`` is any ``storage.StorageBackend``; by default the engine
+        selected by ``MEDIASSIST_STORAGE`` is used (JSON file unless set).
+        One manager is meant to be shared by every session in the process:
+        reads run concurrently under ``lock`` while writes are serialized.
+        Records are upgraded to ``schema.SCHEMA_VERSION`` on first access.
+        """
+        self.storage = storage if storage is not None else create_storage()
+        self.lock = ReadWriteLock()
+        # Usernames whose stored record is known to be at the current schema
+        self._current_users = set()
+        # Section writes avoided because the caller reported them unchanged
+        self.skipped_writes = 0
+        self._skipped_lock = threading.Lock()
+    
+    def flush(self):
+        """Write any buffered storage mutations to disk now"""
+        with self.lock.write_locked():
+            self.storage.flush()
+    
+    def ensure_current(self, username):
+        """Migrate a user's stored record to the current schema, once per process"""
+        if username in self._current_users:
+            return
+        with self.lock.write_locked():
+            user = self.storage.get_user(username)
+            if user is None:
+                return
+            if schema.upgrade_user(user):
+                self.storage.put_user(username, user)
+            self._current_users.add(username)
+    
+    def start_schema_sweep(self):
+        """Upgrade every stored record in the background; see ``schema.start_background_sweep``"""
+        return schema.start_background_sweep(self)
+    
+    def session_view(self, username):
+        """Per-session handle on one user's data; see ``SessionView``"""
+        return SessionView(self, username)
     
     def _hash_password(self, password):
         """Hash password using SHA256"""
@@ -31,101 +56,214 @@ class AuthManager:
     
     def create_user(self, username, password, name, role='member', family_id=None):
         """Create a new user account"""
-        if username in self.users:
-            return False, "Username already exists"
-        
-        if not family_id:
-            family_id = f"family_{len(self.users) + 1}"
-        
-        est_tz = pytz.timezone('US/Eastern')
-        self.users[username] = {
-            'username': username,
-            'password': self._hash_password(password),
-            'name': name,
-            'role': role,
-            'family_id': family_id,
-            'created_at': datetime.now(est_tz).strftime('%Y-%m-%d %H:%M EST'),
-            'profile': {
-                'age': None,
-                'gender': None,
-                'blood_type': None,
-                'allergies': [],
-                'emergency_contact': None
-            },
-            'health_data': {
-                'reports': [],
-                'prescriptions': [],
-                'appointments': [],
-                'symptoms': [],
-                'health_goals': [],
-                'medication_reminders': []
+        with self.lock.write_locked():
+            if self.storage.has_user(username):
+                return False, "Username already exists"
+            
+            if not family_id:
+                family_id = f"family_{self.storage.user_count() + 1}"
+            
+            est_tz = pytz.timezone('US/Eastern')
+            user = {
+                schema.VERSION_KEY: schema.SCHEMA_VERSION,
+                'username': username,
+                'password': self._hash_password(password),
+                'name': name,
+                'role': role,
+                'family_id': family_id,
+                'created_at': datetime.now(est_tz).strftime('%Y-%m-%d %H:%M EST'),
+                'profile': {
+                    'age': None,
+                    'gender': None,
+                    'blood_type': None,
+                    'allergies': [],
+                    'emergency_contact': None
+                },
+                'health_data': {
+                    'reports': [],
+                    'prescriptions': [],
+                    'appointments': [],
+                    'symptoms': [],
+                    'health_goals': [],
+                    'medication_reminders': [],
+                    'symptom_rollups': []
+                }
             }
-        }
-        self._save_users()
+            self.storage.put_user(username, user)
+            self._current_users.add(username)
         return True, "User created successfully"
     
     def authenticate(self, username, password):
         """Authenticate user credentials"""
-        if username not in self.users:
+        self.ensure_current(username)
+        with self.lock.read_locked():
+            user = self.storage.get_user(username)
+        if user is None:
             return False, None
         
-        if self.users[username]['password'] == self._hash_password(password):
-            return True, self.users[username]
+        if user['password'] == self._hash_password(password):
+            return True, user
         return False, None
     
     def get_user(self, username):
         """Get user data"""
-        return self.users.get(username)
+        self.ensure_current(username)
+        with self.lock.read_locked():
+            return self.storage.get_user(username)
     
     def update_user_profile(self, username, profile_data):
         """Update user profile information"""
-        if username in self.users:
-            self.users[username]['profile'].update(profile_data)
-            self._save_users()
-            return True
-        return False
-    
-    def update_user_health_data(self, username, health_data):
-        """Update user health data"""
-        if username in self.users:
-            self.users[username]['health_data'].update(health_data)
-            self._save_users()
-            return True
-        return False
+        self.ensure_current(username)
+        with self.lock.write_locked():
+            return self.storage.update_profile(username, profile_data)
+    
+    def update_user_health_data(self, username, health_data, dirty_sections=None):
+        """Update user health data
+        
+        When ``dirty_sections`` is given only those sections are written and
+        the rest are counted in ``skipped_writes``; with nothing dirty this
+        returns True without taking the write lock or touching storage.
+        """
+        if dirty_sections is not None:
+            changed = {section: data for section, data in health_data.items() if section in dirty_sections}
+            self.count_skipped_writes(len(health_data) - len(changed))
+            if not changed:
+                return True
+            health_data = changed
+        self.ensure_current(username)
+        with self.lock.write_locked():
+            return self.storage.update_health_data(username, health_data)
+    
+    def count_skipped_writes(self, sections):
+        """Add section writes a caller avoided to ``skipped_writes``; takes only a counter lock"""
+        with self._skipped_lock:
+            self.skipped_writes += sections
     
     def get_family_members(self, family_id):
         """Get all members of a family"""
+        with self.lock.read_locked():
+            family = self.storage.get_family_members(family_id)
         members = []
-        for username, data in self.users.items():
-            if data.get('family_id') == family_id:
-                members.append({
-                    'username': username,
-                    'name': data['name'],
-                    'role': data['role'],
-                    'profile': data.get('profile', {})
-                })
+        for data in family:
+            members.append({
+                'username': data['username'],
+                'name': data['name'],
+                'role': data['role'],
+                'profile': data.get('profile', {})
+            })
         return members
     
+    def get_family_member_summaries(self, family_id):
+        """Get all members of a family with their report and prescription counts"""
+        with self.lock.read_locked():
+            return self.storage.get_family_summaries(family_id)
+    
     def add_family_member(self, family_id, username, password, name, role='member'):
         """Add a new family member to existing family"""
         return self.create_user(username, password, name, role, family_id)
     
     def get_user_health_data(self, username, data_type=None):
         """Get specific health data for user"""
-        if username not in self.users:
-            return None
+        self.ensure_current(username)
+        with self.lock.read_locked():
+            return self.storage.get_health_data(username, data_type)
+    
+    def query_reports(self, username, start=None, end=None, limit=None, offset=0, cursor=None,
+                      newest_first=False):
+        """Get a user's reports in a datetime range, one page at a time
         
-        health_data = self.users[username].get('health_data', {})
-        if data_type:
-            return health_data.get(data_type, [])
-        return health_data
+        Returns ``(reports, next_cursor)``; see ``StorageBackend.query_reports``.
+        """
+        self.ensure_current(username)
+        with self.lock.read_locked():
+            return self.storage.query_reports(username, start, end, limit, offset, cursor, newest_first)
+    
+    def report_totals(self, username):
+        """Report, concern and recommendation counts over all of a user's reports"""
+        self.ensure_current(username)
+        with self.lock.read_locked():
+            return self.storage.report_totals(username)
     
     def add_health_data(self, username, data_type, data):
         """Add health data for user"""
-        if username in self.users:
-            if data_type not in self.users[username]['health_data']:
-                self.users[username]['health_data'][data_type] = []
-            self.users[username]['health_data'][data_type].append(data)
-            self._save_users()
-            return True
-        return False
+        self.ensure_current(username)
+        with self.lock.write_locked():
+            return self.storage.append_health_data(username, data_type, data)
+    
+    def add_health_data_batch(self, username, data_type, records):
+        """Add several records to one section in a single storage write"""
+        self.ensure_current(username)
+        with self.lock.write_locked():
+            self.storage.import_batch([], [(username, data_type, data) for data in records])
+    
+    def update_health_item(self, username, data_type, item_id, update):
+        """Apply ``update`` to the record with ``item_id`` in a section and persist it
+        
+        Records handed out by the getters are shared with every session, so
+        they are never edited in place: ``update`` gets a copy, made and
+        swapped into a new section list under the write lock. Returns False
+        when the user or record does not exist.
+        """
+        self.ensure_current(username)
+        with self.lock.write_locked():
+            items = self.storage.get_health_data(username, data_type)
+            if items is None:
+                return False
+            for index, item in enumerate(items):
+                if item.get('id') == item_id:
+                    item = copy.deepcopy(item)
+                    update(item)
+                    items = items[:index] + [item] + items[index + 1:]
+                    return self.storage.update_health_data(username, {data_type: items})
+            return False
+
+
+class SessionView:
+    """One session's handle on a user's data inside the shared AuthManager
+    
+    Sections come back as fresh lists holding the shared records, so a
+    session can append to or pop from its copy without other sessions seeing
+    it; the records themselves are never deep-copied, so they are read-only:
+    to change one, put an edited copy in the session list, or use
+    ``AuthManager.update_health_item`` for sections edited in storage.
+    """
+    
+    def __init__(self, manager, username):
+        self.manager = manager
+        self.username = username
+    
+    def user(self):
+        """The user's record"""
+        return self.manager.get_user(self.username)
+    
+    def sections(self, data_types):
+        """Session-owned lists for several health data sections, read in one pass"""
+        health_data = self.manager.get_user_health_data(self.username)
+        if health_data is None:
+            return {data_type: [] for data_type in data_types}
+        with self.manager.lock.read_locked():
+            return {data_type: list(health_data[data_type]) for data_type in data_types}
+    
+    def query_reports(self, **kwargs):
+        """``AuthManager.query_reports`` for this user"""
+        return self.manager.query_reports(self.username, **kwargs)
+    
+    def report_totals(self):
+        """``AuthManager.report_totals`` for this user"""
+        return self.manager.report_totals(self.username)
+    
+    def add(self, data_type, data):
+        """Append one record to a section in shared storage"""
+        return self.manager.add_health_data(self.username, data_type, data)
+    
+    def add_many(self, data_type, records):
+        """Append several records to a section in shared storage with one write"""
+        return self.manager.add_health_data_batch(self.username, data_type, records)
+    
+    def save(self, health_data, dirty_sections=None):
+        """Write the session's sections back, see ``AuthManager.update_user_health_data``"""
+        return self.manager.update_user_health_data(self.username, health_data, dirty_sections)
+    
+    def skip_save(self, sections):
+        """Record a save with nothing dirty: the sections count as skipped writes, nothing is copied or locked"""
+        self.manager.count_skipped_writes(len(sections))
@@ -0,0 +1,76 @@
+import os
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Files extracted and analyzed at once; analysis waits on the network, so this can exceed the core count
+BATCH_WORKERS = int(os.getenv('MEDIASSIST_BATCH_WORKERS', '8'))
+
+# Item statuses in pipeline order
+QUEUED = 'queued'
+EXTRACTING = 'extracting'
+ANALYZING = 'analyzing'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class BatchItem:
+    """One uploaded file moving through the batch pipeline"""
+    
+    def __init__(self, source, name, file_type):
+        self.source = source
+        self.name = name
+        self.file_type = file_type
+        self.status = QUEUED
+        self.text = None
+        self.analysis = None
+        self.error = None
+        self.seconds = None
+
+
+def process_batch(items, file_processor, health_analyzer, max_workers=BATCH_WORKERS):
+    """Extract and analyze every item concurrently, yielding ``(item, status)`` on each status change
+    
+    Up to ``max_workers`` files are in flight, each going through
+    ``file_processor.extract_text`` then ``health_analyzer.analyze_health_report``,
+    so the batch takes about as long as its slowest file. Updates are
+    yielded on the caller's thread, which is where Streamlit widgets have to
+    be updated. ``status`` is the one the update announced: the live
+    ``item.status`` may already be further along, so callers should go by
+    ``status``; each item yields DONE or FAILED exactly once. A failed file
+    is marked FAILED with its error and does not stop the others. Nothing
+    is stored here.
+    """
+    if not items:
+        return
+    # (item, status) pairs; the status is captured when it is set, since the item moves on
+    updates = queue.Queue()
+    
+    def run(item):
+        started = time.perf_counter()
+        try:
+            item.status = EXTRACTING
+            updates.put((item, EXTRACTING))
+            item.text = file_processor.extract_text(item.source, item.file_type, item.name)
+            if not item.text.strip():
+                raise ValueError("Could not extract text from the file")
+            
+            item.status = ANALYZING
+            updates.put((item, ANALYZING))
+            item.analysis = health_analyzer.analyze_health_report(item.text)
+            item.status = DONE
+        except Exception as e:
+            item.error = str(e)
+            item.status = FAILED
+        item.seconds = time.perf_counter() - started
+        updates.put((item, item.status))
+    
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items)), thread_name_prefix='batch-ingest') as pool:
+        for item in items:
+            pool.submit(run, item)
+        remaining = len(items)
+        while remaining:
+            item, status = updates.get()
+            if status in (DONE, FAILED):
+                remaining -= 1
+            yield item, status
@@ -0,0 +1,112 @@
+"""Round-trip check and throughput comparison for record_codec
+
+Builds a synthetic users file holding 10k reports, verifies that encoding
+and decoding with record_codec restores every record (including tz-aware
+report datetimes), and times it against stdlib json with indent=2.
+
+    python benchmarks/codec_benchmark.py [--reports 10000] [--repeat 5]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import record_codec
+
+
+def build_users(report_count, users_count=50):
+    """Synthetic users dict with ``report_count`` reports spread over users"""
+    est = timezone(timedelta(hours=-5), 'EST')
+    start = datetime(2020, 1, 1, 9, 0, tzinfo=est)
+    users = {}
+    for u in range(users_count):
+        username = f"user{u}"
+        users[username] = {
+            'username': username,
+            'password': '0' * 64,
+            'name': f"User {u}",
+            'role': 'member',
+            'family_id': f"family_{u // 4}",
+            'created_at': '2020-01-01 09:00 EST',
+            'profile': {'age': 40, 'gender': None, 'blood_type': 'O+', 'allergies': [], 'emergency_contact': None},
+            'health_data': {section: [] for section in
+                            ('reports', 'prescriptions', 'appointments', 'symptoms',
+                             'health_goals', 'medication_reminders')}
+        }
+    for i in range(report_count):
+        when = start + timedelta(hours=7 * i)
+        users[f"user{i % users_count}"]['health_data']['reports'].append({
+            'id': f"report_{i}",
+            'filename': f"lab_{i}.pdf",
+            'date': when.strftime('%Y-%m-%d %H:%M EST'),
+            'datetime_obj': when,
+            'summary': 'Routine panel; values within normal limits. ' * 3,
+            'concerns': ['Slightly elevated LDL'] if i % 3 == 0 else [],
+            'recommendations': ['Recheck lipids in 6 months', 'Increase activity'],
+            'metrics': [
+                {'name': 'Glucose', 'value': f"{80 + i % 40} mg/dL", 'normal_range': '70-100 mg/dL', 'raw_value': 80.0 + i % 40},
+                {'name': 'Blood Pressure', 'value': '120/80 mmHg', 'normal_range': '90-120/60-80 mmHg',
+                 'raw_values': {'systolic': 120, 'diastolic': 80}}
+            ],
+            'extracted_text_hash': f"{i:064x}",
+            'downloaded': False
+        })
+    return users
+
+
+def best_of(repeat, func):
+    """Fastest wall time of ``repeat`` runs, and the last result"""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reports', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    users = build_users(args.reports)
+
+    # Round trip: every field, datetimes included, must come back equal
+    encoded = record_codec.dumps(users, pretty=False)
+    decoded = record_codec.decode_users(record_codec.loads(encoded))
+    assert decoded == users, "record_codec round trip changed the data"
+    for user in decoded.values():
+        for report in user['health_data']['reports']:
+            assert report['datetime_obj'].tzinfo is not None, "decoded datetime is naive"
+    print(f"round trip OK: {args.reports} reports, {len(encoded) / 1e6:.1f} MB compact")
+
+    backend = 'orjson' if record_codec.orjson is not None else 'stdlib json'
+    rows = [
+        ('encode  json indent=2', lambda: json.dumps(users, indent=2, default=str)),
+        (f"encode  codec compact ({backend})", lambda: record_codec.dumps(users, pretty=False)),
+        (f"encode  codec pretty ({backend})", lambda: record_codec.dumps(users, pretty=True)),
+    ]
+    pretty_stdlib = json.dumps(users, indent=2, default=str)
+    rows += [
+        ('decode  json.loads (no datetimes)', lambda: json.loads(pretty_stdlib)),
+        (f"decode  codec + datetimes ({backend})",
+         lambda: record_codec.decode_users(record_codec.loads(encoded))),
+    ]
+
+    baseline = None
+    for label, func in rows:
+        seconds, _ = best_of(args.repeat, func)
+        if label.startswith('encode  json') or label.startswith('decode  json'):
+            baseline = seconds
+        print(f"{label:45s} {seconds * 1000:8.1f} ms  ({baseline / seconds:4.1f}x vs stdlib)")
+
+
+if __name__ == '__main__':
+    main()
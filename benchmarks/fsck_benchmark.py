@@ -0,0 +1,84 @@
+"""Salvage check and scan throughput for fsck
+
+Creates users through AuthManager (so records carry the current schema and
+field order), damages one of them in two ways, and verifies that fsck
+reports it and salvages every record after it. Then times a scan of a
+synthetic users file.
+
+    python benchmarks/fsck_benchmark.py [--users 2000]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fsck
+from auth_manager import AuthManager
+from storage import JSONFileStorage
+
+# Bob's name field, compact or pretty-printed
+BOB_NAME = re.compile(rb'"name":\s*"Bob"')
+
+# Each damages bob's record: one still well bracketed, one that throws the bracket count off
+DAMAGE = {
+    'invalid value': b'"name": Bob',
+    'unterminated string': b'"name": "Bob',
+}
+
+
+def build_users_file(path, names):
+    """Users file written by the current create_user and JSON storage"""
+    storage = JSONFileStorage(path, flush_delay=0)
+    manager = AuthManager(storage)
+    for name in names:
+        manager.create_user(name.lower(), 'secret', name)
+    storage.compact()
+    storage.close()
+
+
+def check_salvage(tmp_dir):
+    path = os.path.join(tmp_dir, 'users_data.json')
+    build_users_file(path, ['Alice', 'Bob', 'Carol', 'Dave'])
+    with open(path, 'rb') as f:
+        original = f.read()
+
+    assert len(BOB_NAME.findall(original)) == 1, "bob's name not found in the snapshot"
+    for case, damaged in DAMAGE.items():
+        with open(path, 'wb') as f:
+            f.write(BOB_NAME.sub(damaged, original))
+        kept = []
+        issues = []
+        for key, raw, issue in fsck.scan_users_file(path):
+            if issue is not None:
+                issues.append(issue)
+            elif key != '__journal_seq__':
+                kept.append(key)
+        assert kept == ['alice', 'carol', 'dave'], f"{case}: salvaged {kept}"
+        assert [issue.key for issue in issues] == ['bob'], f"{case}: issues {[str(i) for i in issues]}"
+        print(f"{case}: kept {', '.join(kept)}; {issues[0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        check_salvage(tmp_dir)
+
+        path = os.path.join(tmp_dir, 'big.json')
+        build_users_file(path, [f"User{n}" for n in range(args.users)])
+        size = os.path.getsize(path)
+        started = time.perf_counter()
+        records = sum(1 for _, raw, _ in fsck.scan_users_file(path) if raw is not None)
+        seconds = time.perf_counter() - started
+        print(f"scanned {records} records ({size / 1e6:.1f} MB) in {seconds:.2f}s, "
+              f"{size / 1e6 / seconds:.0f} MB/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""OCR latency of the warm tesserocr pool against pytesseract per image
+
+Renders a synthetic corpus of small lab-report snippets, then OCRs it with
+every engine that can start here: one image at a time (per-image latency,
+where model loading dominates pytesseract) and all at once through the
+engine's bounded concurrency (throughput). Character accuracy against the
+rendered text is printed so a faster engine cannot hide worse output.
+
+    python benchmarks/ocr_benchmark.py [--images 40] [--concurrency 4]
+"""
+import argparse
+import difflib
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ocr_engine
+
+LINES = [
+    'Hemoglobin 13.8 g/dL (13.5-17.5)',
+    'Glucose, fasting 104 mg/dL (70-99) HIGH',
+    'LDL Cholesterol 142 mg/dL (<100)',
+    'Blood Pressure 128/84 mmHg',
+    'TSH 2.1 mIU/L (0.4-4.0)',
+    'Creatinine 0.9 mg/dL (0.7-1.3)',
+]
+
+
+def build_corpus(count, lines_per_image=4):
+    """``count`` (image, expected_text) pairs of rendered report lines"""
+    font = ImageFont.load_default(size=28)
+    corpus = []
+    for i in range(count):
+        lines = [LINES[(i + n) % len(LINES)] for n in range(lines_per_image)]
+        image = Image.new('RGB', (900, 60 + 44 * lines_per_image), 'white')
+        draw = ImageDraw.Draw(image)
+        for n, line in enumerate(lines):
+            draw.text((30, 30 + 44 * n), line, fill='black', font=font)
+        corpus.append((image, '\n'.join(lines)))
+    return corpus
+
+
+def accuracy(expected, actual):
+    """Character-level similarity of OCR output to the rendered text, 0..1"""
+    return difflib.SequenceMatcher(None, ' '.join(expected.split()), ' '.join(actual.split())).ratio()
+
+
+def run(engine, corpus, concurrency):
+    """Per-image latencies (sequential), then wall time for the whole corpus at once"""
+    latencies = []
+    scores = []
+    for image, expected in corpus:
+        start = time.perf_counter()
+        text = engine.recognize(image)
+        latencies.append(time.perf_counter() - start)
+        scores.append(accuracy(expected, text))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(engine.recognize, [image for image, _ in corpus]))
+    batch = time.perf_counter() - start
+    return latencies, batch, statistics.mean(scores)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=ocr_engine.OCR_CONCURRENCY)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.images)
+    engines = [('pytesseract', lambda: ocr_engine.PytesseractEngine(concurrency=args.concurrency))]
+    if ocr_engine.tesserocr is not None:
+        engines.append(('tesserocr pool', lambda: ocr_engine.TesserocrPoolEngine(concurrency=args.concurrency)))
+    else:
+        print('tesserocr not installed; only the pytesseract baseline runs')
+
+    baseline = None
+    for label, factory in engines:
+        start = time.perf_counter()
+        engine = factory()
+        startup = time.perf_counter() - start
+        try:
+            latencies, batch, score = run(engine, corpus, args.concurrency)
+        finally:
+            engine.close()
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        baseline = baseline or p50
+        print(f"{label:16s} startup {startup * 1000:7.1f} ms  p50 {p50 * 1000:7.1f} ms  p95 {p95 * 1000:7.1f} ms  "
+              f"{args.images} images x{args.concurrency} {batch:6.2f} s  accuracy {score:.3f}  "
+              f"({baseline / p50:4.1f}x p50 vs pytesseract)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Latency and character accuracy of OCR preprocessing presets on phone-style photos
+
+Renders synthetic 12-megapixel "photos" of a lab report page (slightly
+rotated, unevenly lit, no usable DPI metadata), then for every preset in
+image_preprocess.PRESETS times preprocessing and OCR separately and scores
+the OCR output against the rendered text.
+
+    python benchmarks/preprocess_benchmark.py [--photos 3] [--skew 2.5] [--engine auto]
+"""
+import argparse
+import difflib
+import os
+import statistics
+import sys
+import time
+
+from PIL import Image, ImageChops, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import image_preprocess
+import ocr_engine
+
+LINES = [
+    'COMPREHENSIVE METABOLIC PANEL',
+    'Glucose, fasting 104 mg/dL 70-99 HIGH',
+    'Sodium 139 mmol/L 136-145',
+    'Potassium 4.2 mmol/L 3.5-5.1',
+    'Creatinine 0.9 mg/dL 0.7-1.3',
+    'LDL Cholesterol 142 mg/dL <100 HIGH',
+    'HDL Cholesterol 51 mg/dL >40',
+    'Hemoglobin A1c 5.9 % 4.0-5.6 HIGH',
+]
+
+
+def build_photo(seed, skew):
+    """(3000x4000 photo, expected text) with a lighting gradient and rotated page"""
+    font = ImageFont.load_default(size=72)
+    lines = [LINES[(seed + n) % len(LINES)] for n in range(len(LINES))] * 3
+    page = Image.new('L', (3000, 4000), 255)
+    draw = ImageDraw.Draw(page)
+    for n, line in enumerate(lines):
+        draw.text((200, 200 + 150 * n), line, fill=30, font=font)
+    page = page.rotate(skew if seed % 2 else -skew, resample=Image.BICUBIC, fillcolor=255)
+    # Light falls off towards one corner, as with a phone held over a desk
+    shade = Image.linear_gradient('L').resize(page.size).point(lambda value: value // 3)
+    page = ImageChops.subtract(page, shade)
+    return page.convert('RGB'), '\n'.join(lines)
+
+
+def accuracy(expected, actual):
+    """Character-level similarity of OCR output to the rendered text, 0..1"""
+    return difflib.SequenceMatcher(None, ' '.join(expected.split()), ' '.join(actual.split())).ratio()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--photos', type=int, default=3)
+    parser.add_argument('--skew', type=float, default=2.5, help='page rotation in degrees')
+    parser.add_argument('--engine', default=ocr_engine.OCR_ENGINE, help='auto, tesserocr or pytesseract')
+    args = parser.parse_args()
+
+    photos = [build_photo(seed, args.skew) for seed in range(args.photos)]
+    engine = ocr_engine.create_ocr_engine(args.engine)
+    print(f"{args.photos} photos of {photos[0][0].width}x{photos[0][0].height}, OCR via {engine.name}")
+
+    baseline = None
+    try:
+        for preset in image_preprocess.PRESETS:
+            prep_times, ocr_times, scores = [], [], []
+            for photo, expected in photos:
+                start = time.perf_counter()
+                prepared = image_preprocess.preprocess_image(photo, preset)
+                prep_times.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                text = engine.recognize(prepared)
+                ocr_times.append(time.perf_counter() - start)
+                scores.append(accuracy(expected, text))
+            total = statistics.mean(prep_times) + statistics.mean(ocr_times)
+            baseline = baseline or total
+            print(f"{preset:10s} preprocess {statistics.mean(prep_times) * 1000:7.0f} ms  "
+                  f"ocr {statistics.mean(ocr_times) * 1000:7.0f} ms  total {total:6.2f} s "
+                  f"({total / baseline:4.2f} of 'none')  accuracy {statistics.mean(scores):.3f}")
+    finally:
+        engine.close()
+
+
+if __name__ == '__main__':
+    main()
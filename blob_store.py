@@ -0,0 +1,49 @@
+import hashlib
+import os
+import zlib
+
+class BlobStore:
+    """Content-addressed store for large report text
+
+    Each text is zlib-compressed and written once under the SHA-256 of its
+    UTF-8 bytes, so identical documents uploaded by different family members
+    share a single file and report records only need to keep the hash.
+    """
+
+    def __init__(self, root=None):
+        """Initialize the blob store rooted at ``root`` (MEDIASSIST_BLOB_DIR by default)"""
+        self.root = root or os.getenv('MEDIASSIST_BLOB_DIR', 'report_blobs')
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, digest):
+        """Blob file path, fanned out by the first two hex digits"""
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def put(self, text):
+        """Store text and return its content hash"""
+        data = text.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if os.path.exists(path):
+            return digest
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(zlib.compress(data))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest):
+        """Return the text stored under a hash, or None if it is missing"""
+        try:
+            with open(self._path(digest), 'rb') as f:
+                return zlib.decompress(f.read()).decode('utf-8')
+        except FileNotFoundError:
+            return None
+
+    def contains(self, digest):
+        """Whether a blob with this hash is stored"""
+        return os.path.exists(self._path(digest))
@@ -0,0 +1,172 @@
+import argparse
+import os
+import sys
+
+import record_codec
+from storage import create_storage
+
+# Input lines committed to storage per batch
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _user_line(user):
+    """NDJSON line for a user record, health data sections emptied out"""
+    identity = dict(user)
+    identity['health_data'] = {data_type: [] for data_type in user.get('health_data') or {}}
+    return record_codec.dumps({'type': 'user', 'user': identity}, pretty=False)
+
+
+def _record_line(username, data_type, data):
+    """NDJSON line for one health record"""
+    return record_codec.dumps(
+        {'type': 'record', 'username': username, 'data_type': data_type, 'data': data},
+        pretty=False
+    )
+
+
+def export_ndjson(storage, out):
+    """Write every user, then each of their health records, one JSON object per line
+    
+    Users are pulled from ``storage.iter_users()`` one at a time, so memory
+    use is bounded by the largest single user, not by the store. Returns
+    ``(users, records)`` written.
+    """
+    users = records = 0
+    for user in storage.iter_users():
+        out.write(_user_line(user) + '\n')
+        users += 1
+        for data_type, section in (user.get('health_data') or {}).items():
+            for data in section:
+                out.write(_record_line(user['username'], data_type, data) + '\n')
+                records += 1
+    return users, records
+
+
+def _read_checkpoint(path):
+    """Byte offset of the first uncommitted input line, 0 without a checkpoint"""
+    try:
+        with open(path) as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def _write_checkpoint(path, offset):
+    """Record that every input line before ``offset`` is committed"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(str(offset))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def import_ndjson(storage, path, batch_size=DEFAULT_BATCH_SIZE, checkpoint=None):
+    """Stream an NDJSON export into ``storage`` in batches, resuming from ``checkpoint``
+    
+    Only the current batch is held in memory. Each batch is committed
+    through ``storage.import_batch`` with the byte offset of the next line,
+    so a rerun after a crash picks up at the first uncommitted batch; the
+    checkpoint is removed once the file is done. SQLite stores the offset
+    in the batch's own transaction. Other engines cannot, so it goes to the
+    ``checkpoint`` file after the batch is durable: a crash between the two
+    re-imports that one batch on the rerun, upserting its users again
+    (harmless) and appending its records a second time.
+    User lines upsert, record lines append to their user, whether the user
+    arrived earlier in the same batch or in a previous one. Returns
+    ``(users, records)`` imported by this run.
+    """
+    offset = 0
+    if checkpoint:
+        offset = storage.import_checkpoint(checkpoint)
+        if offset is None:
+            offset = _read_checkpoint(checkpoint)
+    imported_users = imported_records = 0
+    batch_users = {}
+    batch_records = []
+    pending_lines = 0
+    
+    def commit(next_offset):
+        atomic = storage.import_batch(
+            list(batch_users.values()), batch_records, (checkpoint, next_offset) if checkpoint else None
+        )
+        if checkpoint and not atomic:
+            _write_checkpoint(checkpoint, next_offset)
+        batch_users.clear()
+        batch_records.clear()
+    
+    # JSON storage would otherwise compact after every batch once past its threshold
+    with storage.bulk_import():
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                offset += len(line)
+                if not line.strip():
+                    continue
+                entry = record_codec.loads(line)
+                if entry['type'] == 'user':
+                    user = entry['user']
+                    user.setdefault('health_data', {})
+                    batch_users[user['username']] = user
+                    imported_users += 1
+                elif entry['type'] == 'record':
+                    data = record_codec.decode_section(entry['data_type'], [entry['data']])[0]
+                    user = batch_users.get(entry['username'])
+                    if user is not None:
+                        user['health_data'].setdefault(entry['data_type'], []).append(data)
+                    else:
+                        batch_records.append((entry['username'], entry['data_type'], data))
+                    imported_records += 1
+                else:
+                    raise ValueError(f"Unknown NDJSON entry type: {entry['type']!r}")
+                
+                pending_lines += 1
+                if pending_lines >= batch_size:
+                    commit(offset)
+                    pending_lines = 0
+        
+        if pending_lines:
+            commit(offset)
+    if checkpoint:
+        storage.clear_import_checkpoint(checkpoint)
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+    return imported_users, imported_records
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Stream users and health records in or out as NDJSON '
+                    '(storage engine chosen by MEDIASSIST_STORAGE)'
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    export_parser = commands.add_parser('export', help='write all users and records as NDJSON')
+    export_parser.add_argument('output', nargs='?', default='-', help='output file, - for stdout')
+    
+    import_parser = commands.add_parser('import', help='load an NDJSON export in resumable batches')
+    import_parser.add_argument('input')
+    import_parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    import_parser.add_argument('--checkpoint', help='progress file, or its key in SQLite storage (default: <input>.checkpoint)')
+    import_parser.add_argument('--restart', action='store_true', help='ignore an existing checkpoint')
+    args = parser.parse_args()
+    
+    storage = create_storage()
+    try:
+        if args.command == 'export':
+            if args.output == '-':
+                users, records = export_ndjson(storage, sys.stdout)
+            else:
+                with open(args.output, 'w') as out:
+                    users, records = export_ndjson(storage, out)
+            print(f"Exported {users} users and {records} records", file=sys.stderr)
+        else:
+            checkpoint = args.checkpoint or f"{args.input}.checkpoint"
+            if args.restart:
+                storage.clear_import_checkpoint(checkpoint)
+                if os.path.exists(checkpoint):
+                    os.remove(checkpoint)
+            users, records = import_ndjson(storage, args.input, args.batch_size, checkpoint)
+            print(f"Imported {users} users and {records} records from {args.input}")
+    finally:
+        storage.close()
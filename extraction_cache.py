@@ -0,0 +1,211 @@
+import atexit
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Total size of cached extractions on disk; 0 disables the cache
+CACHE_MAX_BYTES = int(os.getenv('MEDIASSIST_EXTRACT_CACHE_MAX_BYTES', str(512 << 20)))
+
+# Entries unused for this many days are dropped
+CACHE_MAX_AGE_DAYS = float(os.getenv('MEDIASSIST_EXTRACT_CACHE_MAX_AGE_DAYS', '30'))
+
+# Eviction trims down to this fraction of the size limit, so it does not run on every write
+_EVICT_TO = 0.9
+
+# Counters shared by every process using the directory, folded in at most this often
+_STATS_FILE = 'stats.json'
+_STATS_INTERVAL = 5.0
+_COUNTERS = ('hits', 'misses', 'stores', 'evictions')
+
+
+class ExtractionCache:
+    """On-disk LRU cache of extracted page texts keyed by content hash and settings
+    
+    Each entry is the zlib-compressed JSON list of a document's page texts,
+    stored under the SHA-256 of the file's content hash plus everything that
+    changes the output (extractor version, OCR engine and version,
+    preprocessing preset). A hit touches the entry's mtime, so eviction by
+    oldest mtime is least-recently-used, across processes sharing the
+    directory. The attributes count this process; every few seconds and
+    at exit they are added to ``stats.json`` in the directory, so
+    ``stats()`` (and ``python extraction_cache.py``) report totals over
+    every process sharing it.
+    """
+    
+    def __init__(self, root=None, max_bytes=CACHE_MAX_BYTES, max_age_days=CACHE_MAX_AGE_DAYS):
+        """Initialize the cache rooted at ``root`` (MEDIASSIST_EXTRACT_CACHE_DIR by default)"""
+        self.root = root or os.getenv('MEDIASSIST_EXTRACT_CACHE_DIR', 'extraction_cache')
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 24 * 60 * 60
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._size = 0
+        # Counts not yet added to the stats file, and when it was last written
+        self._unsaved = dict.fromkeys(_COUNTERS, 0)
+        self._stats_saved_at = time.monotonic()
+        atexit.register(self.save_stats)
+        # Sizes the cache and drops entries that expired while no process was running
+        self.evict()
+    
+    @staticmethod
+    def key(content_hash, settings):
+        """Cache key for a document hash under the given extraction settings"""
+        return hashlib.sha256(f"{content_hash}\n{settings}".encode('utf-8')).hexdigest()
+    
+    def _path(self, key):
+        """Entry file path, fanned out by the first two hex digits"""
+        return os.path.join(self.root, key[:2], key[2:])
+    
+    def _entries(self):
+        """``(path, mtime, size)`` of every entry on disk"""
+        for fan_out in os.scandir(self.root):
+            if not fan_out.is_dir():
+                continue
+            for entry in os.scandir(fan_out.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield entry.path, stat.st_mtime, stat.st_size
+    
+    def get(self, key):
+        """Cached page texts for a key, or None"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                if time.time() - stat.st_mtime > self.max_age:
+                    raise FileNotFoundError(path)
+                pages = json.loads(zlib.decompress(f.read()))
+            os.utime(path)
+        except (FileNotFoundError, ValueError, zlib.error):
+            self._count('misses')
+            return None
+        self._count('hits')
+        return pages
+    
+    def put(self, key, pages):
+        """Store a document's page texts, evicting old entries past the size limit"""
+        data = zlib.compress(json.dumps(pages).encode('utf-8'))
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._size += len(data)
+            over = self._size > self.max_bytes
+        self._count('stores')
+        if over:
+            self.evict()
+    
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under the size limit"""
+        with self._lock:
+            now = time.time()
+            entries = sorted(self._entries(), key=lambda entry: entry[1])
+            size = sum(entry_size for _, _, entry_size in entries)
+            for path, mtime, entry_size in entries:
+                if now - mtime <= self.max_age and size <= self.max_bytes * _EVICT_TO:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                size -= entry_size
+                self.evictions += 1
+                self._unsaved['evictions'] += 1
+            self._size = size
+        self._maybe_save_stats()
+    
+    def _count(self, counter):
+        """Bump a counter, writing the stats file when it is due"""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            self._unsaved[counter] += 1
+        self._maybe_save_stats()
+    
+    def _maybe_save_stats(self):
+        if time.monotonic() - self._stats_saved_at >= _STATS_INTERVAL:
+            self.save_stats()
+    
+    def _update_stats_file(self, unsaved):
+        """Add ``unsaved`` to the totals in the stats file and return the new totals"""
+        with open(os.path.join(self.root, _STATS_FILE), 'a+') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    totals = json.loads(f.read() or '{}')
+                except ValueError:
+                    totals = {}
+                totals = {counter: totals.get(counter, 0) + unsaved[counter] for counter in _COUNTERS}
+                if any(unsaved.values()):
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(totals))
+                    f.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return totals
+    
+    def save_stats(self):
+        """Add this process's counts since the last save to the shared stats file; returns the totals"""
+        with self._lock:
+            unsaved, self._unsaved = self._unsaved, dict.fromkeys(_COUNTERS, 0)
+            self._stats_saved_at = time.monotonic()
+        try:
+            return self._update_stats_file(unsaved)
+        except OSError as e:
+            print(f"Could not save extraction cache stats: {e}", file=sys.stderr)
+            with self._lock:
+                for counter in _COUNTERS:
+                    self._unsaved[counter] += unsaved[counter]
+            return dict(unsaved)
+    
+    def stats(self):
+        """Counters for scraping, totalled over every process: hits, misses, stores, evictions and bytes on disk"""
+        stats = self.save_stats()
+        with self._lock:
+            stats['bytes'] = self._size
+        stats['max_bytes'] = self.max_bytes
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_extraction_cache():
+    """Cache shared by every FileProcessor in the process, or None when disabled"""
+    global _cache
+    if CACHE_MAX_BYTES <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ExtractionCache()
+        return _cache
+
+
+if __name__ == '__main__':
+    cache = ExtractionCache()
+    cache.evict()
+    print(json.dumps(cache.stats()))
@@ -1,80 +1,463 @@
+import hashlib
+import json
 import os
+import sys
 import tempfile
+import threading
+import time
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from PIL import Image
-import pytesseract
 import PyPDF2
 import io
 
+from extraction_cache import get_extraction_cache
+from image_preprocess import OCR_PRESET, PRESETS, preprocess_image
+from ocr_engine import get_ocr_engine
+
+try:
+    from pdf2image import convert_from_bytes, convert_from_path
+except ImportError:
+    convert_from_bytes = convert_from_path = None
+
+# Bump when a change to extraction alters its output, so cached results are not reused
+EXTRACTION_VERSION = 2
+
+# PDFs with fewer pages than this are extracted in-process; pool overhead would dominate
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('MEDIASSIST_PDF_PARALLEL_MIN_PAGES', '16'))
+
+# Worker processes for PDF page extraction (defaults to one per core)
+PDF_WORKERS = int(os.getenv('MEDIASSIST_PDF_WORKERS', '0')) or os.cpu_count() or 1
+
+# Page chunks handed out per worker, so uneven pages still balance across the pool
+_CHUNKS_PER_WORKER = 4
+
+# Bytes hashed per read when a source has no buffer to hash in place
+_HASH_CHUNK = 1 << 20
+
+# A PDF page whose text layer has fewer letters and digits than this is OCRed instead
+OCR_MIN_CHARS = int(os.getenv('MEDIASSIST_OCR_MIN_CHARS', '20'))
+
+# Resolution image-only PDF pages are rasterized at for OCR
+OCR_DPI = int(os.getenv('MEDIASSIST_OCR_DPI', '300'))
+
+# Concurrent image-only pages being rasterized and handed to the OCR engine
+OCR_WORKERS = int(os.getenv('MEDIASSIST_OCR_WORKERS', '0')) or os.cpu_count() or 1
+
+# Decoded frames of a multi-frame TIFF/GIF held in memory at once while they wait for OCR
+OCR_MAX_FRAMES = int(os.getenv('MEDIASSIST_OCR_MAX_FRAMES', '0')) or OCR_WORKERS * 2
+
+# Default for FileProcessor's cache argument, so that None can mean no cache
+_SHARED_CACHE = object()
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+_ocr_pool = None
+
+
+def _get_pdf_pool():
+    """Process pool shared by every FileProcessor, started on first use"""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # spawn: forking a multi-threaded server process can deadlock the children
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pdf_pool
+
+
+def _get_ocr_pool():
+    """Thread pool rasterizing image-only pages and waiting on their OCR"""
+    global _ocr_pool
+    with _pdf_pool_lock:
+        if _ocr_pool is None:
+            _ocr_pool = ThreadPoolExecutor(max_workers=OCR_WORKERS, thread_name_prefix='page-ocr')
+        return _ocr_pool
+
+
+def _needs_ocr(text):
+    """Whether a page's text layer is missing or garbage (mostly symbols from unmapped fonts)"""
+    if not text:
+        return True
+    visible = [char for char in text if not char.isspace()]
+    alphanumeric = sum(1 for char in visible if char.isalnum())
+    return alphanumeric < OCR_MIN_CHARS or alphanumeric < len(visible) / 2
+
+
+def _open_document(document):
+    """Binary stream over a document: a file path or an in-memory buffer"""
+    if isinstance(document, str):
+        return open(document, 'rb')
+    # BytesIO over bytes shares their memory until something writes to it
+    return io.BytesIO(document)
+
+
+def _rasterize_pdf_page(document, page_num):
+    """Images of one PDF page for OCR
+    
+    With pdf2image (poppler) the whole page is rendered at OCR_DPI;
+    otherwise the page's embedded images are used, which for scanned
+    documents is the scan itself.
+    """
+    if convert_from_path is not None:
+        pages = dict(dpi=OCR_DPI, first_page=page_num + 1, last_page=page_num + 1)
+        if isinstance(document, str):
+            return convert_from_path(document, **pages)
+        return convert_from_bytes(document, **pages)
+    # pdf2image is optional; without it text drawn as vector paths is never seen by OCR
+    print(f"pdf2image not installed; OCRing the embedded images of PDF page {page_num + 1}", file=sys.stderr)
+    with _open_document(document) as file:
+        page = PyPDF2.PdfReader(file).pages[page_num]
+        return [Image.open(io.BytesIO(image.data)) for image in page.images]
+
+
+def _timed_page_text(page):
+    """``(text, seconds)`` for extracting one PDF page's text layer"""
+    started = time.perf_counter()
+    text = page.extract_text()
+    return text, time.perf_counter() - started
+
+
+def _extract_pdf_pages(document, start, stop):
+    """``(text, seconds)`` for pages ``start``..``stop - 1`` of a PDF (runs in a worker)"""
+    with _open_document(document) as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return [_timed_page_text(pdf_reader.pages[page_num]) for page_num in range(start, stop)]
+
+
 class FileProcessor:
-    def __init__(self):
-        """Initialize the file processor"""
-        self.supported_image_formats = ['.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.gif']
+    def __init__(self, ocr_engine=None, ocr_preset=None, cache=_SHARED_CACHE):
+        """Initialize the file processor (shared OCR engine and extraction cache unless given; cache=None disables caching)"""
+        self.ocr_engine = ocr_engine or get_ocr_engine()
+        # Preprocessing preset from image_preprocess.PRESETS; None means MEDIASSIST_OCR_PRESET
+        self.ocr_preset = ocr_preset
+        # None when disabled here or by MEDIASSIST_EXTRACT_CACHE_MAX_BYTES=0
+        self.cache = get_extraction_cache() if cache is _SHARED_CACHE else cache
+        self.supported_image_formats = ['.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.tif', '.gif']
         self.supported_text_formats = ['.txt']
         self.supported_pdf_formats = ['.pdf']
     
-    def extract_text(self, file_path, file_type):
+    def extract_text(self, source, file_type, filename=None):
         """
         Extract text from various file formats
+        
+        ``source`` is a file path, a bytes-like object or a binary file
+        object such as a Streamlit upload; in-memory sources never touch
+        the disk. ``filename`` helps detect the format when ``source`` is
+        not a path.
+        """
+        return "\n".join(text for _, text, _ in self.iter_pages(source, file_type, filename)).strip()
+    
+    def iter_pages(self, source, file_type, filename=None):
+        """
+        Stream extraction page by page
+        
+        Yields ``(page_number, text, timings)`` as each page finishes, page
+        numbers starting at 1 and always in order. ``timings`` holds
+        ``extract`` (seconds spent on that page) and ``elapsed`` (seconds
+        since the call). Each frame of a multi-frame TIFF or GIF is a page;
+        other images and text files are a single page. Sources are
+        accepted as for ``extract_text``.
+        
+        PDFs and images are looked up in the extraction cache by content
+        hash and settings first; a hit replays the cached pages, a complete
+        miss is stored for next time. A PDF where OCR of some page failed is
+        not stored, so the next upload of it tries again.
         """
+        started = time.perf_counter()
         try:
-            file_extension = os.path.splitext(file_path)[1].lower()
+            document = self._load_document(source)
+            kind = self._file_kind(self._source_name(source, filename), file_type)
+            cache_key = None
+            if self.cache is not None and kind != 'text':
+                cache_key = self.cache.key(self._content_hash(document), self._cache_settings(kind))
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    for page_number, text in enumerate(cached, 1):
+                        yield page_number, text, {'extract': 0.0, 'elapsed': time.perf_counter() - started}
+                    return
             
-            if file_type.startswith('image/') or file_extension in self.supported_image_formats:
-                return self._extract_text_from_image(file_path)
-            elif file_type == 'application/pdf' or file_extension in self.supported_pdf_formats:
-                return self._extract_text_from_pdf(file_path)
-            elif file_type.startswith('text/') or file_extension in self.supported_text_formats:
-                return self._extract_text_from_text_file(file_path)
+            # Page numbers whose OCR failed and fell back to the text layer
+            ocr_failures = []
+            if kind == 'pdf':
+                pages = self._iter_pdf_pages(document, ocr_failures)
+            elif kind == 'image':
+                pages = self._iter_image_pages(document)
             else:
-                raise ValueError(f"Unsupported file type: {file_type}")
-                
+                pages = self._iter_single_page(self._extract_text_from_text_file, document)
+            
+            texts = []
+            for page_number, text, seconds in pages:
+                texts.append(text)
+                yield page_number, text, {'extract': seconds, 'elapsed': time.perf_counter() - started}
+            if cache_key is not None and not ocr_failures:
+                self.cache.put(cache_key, texts)
         except Exception as e:
             raise Exception(f"Failed to extract text: {str(e)}")
     
-    def _extract_text_from_image(self, image_path):
-        """Extract text from image using OCR"""
+    def page_count(self, source, file_type, filename=None):
+        """
+        Number of pages ``iter_pages`` will yield, for progress display
+        """
+        kind = self._file_kind(self._source_name(source, filename), file_type)
+        if kind == 'pdf':
+            with _open_document(self._load_document(source)) as file:
+                return len(PyPDF2.PdfReader(file).pages)
+        if kind == 'image':
+            # Only the headers are read, no frame is decoded
+            with Image.open(_open_document(self._load_document(source))) as image:
+                return getattr(image, 'n_frames', 1)
+        return 1
+    
+    def _load_document(self, source):
+        """A path string, or the source's bytes, copied at most once
+        
+        Everything downstream wraps the result in a BytesIO per open, which
+        shares the memory of a bytes object but copies any other buffer, so
+        every other kind is turned into bytes here: bytes are used as is,
+        in-memory files (BytesIO, Streamlit uploads) give theirs through
+        ``getvalue()``, other buffers are copied once and other file objects
+        are read.
+        """
+        if isinstance(source, (str, os.PathLike)):
+            return os.fspath(source)
+        if isinstance(source, bytes):
+            return source
+        if isinstance(source, (bytearray, memoryview)):
+            return bytes(source)
+        if hasattr(source, 'getvalue'):
+            return source.getvalue()
+        source.seek(0)
+        return source.read()
+    
+    def _source_name(self, source, filename):
+        """File name used to detect the format: ``filename``, the path, or the file object's name"""
+        if filename:
+            return filename
+        if isinstance(source, (str, os.PathLike)):
+            return os.fspath(source)
+        return getattr(source, 'name', None) or ''
+    
+    def _file_kind(self, file_name, file_type):
+        """'image', 'pdf' or 'text' for a supported file, ValueError otherwise"""
+        file_extension = os.path.splitext(file_name)[1].lower()
+        
+        if file_type.startswith('image/') or file_extension in self.supported_image_formats:
+            return 'image'
+        elif file_type == 'application/pdf' or file_extension in self.supported_pdf_formats:
+            return 'pdf'
+        elif file_type.startswith('text/') or file_extension in self.supported_text_formats:
+            return 'text'
+        else:
+            raise ValueError(f"Unsupported file type: {file_type}")
+    
+    def _content_hash(self, document):
+        """SHA-256 of a document's bytes, hashed in place for bytes and in chunks for paths"""
+        if not isinstance(document, str):
+            return hashlib.sha256(document).hexdigest()
+        digest = hashlib.sha256()
+        with open(document, 'rb') as file:
+            for chunk in iter(lambda: file.read(_HASH_CHUNK), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def _cache_settings(self, kind):
+        """Everything besides the file's bytes that changes what extraction returns"""
+        preset = self.ocr_preset or OCR_PRESET
+        try:
+            ocr_version = self.ocr_engine.version()
+        except Exception:
+            # Text-layer PDFs still extract without tesseract; their cache key must not depend on it
+            ocr_version = 'ocr-unavailable'
+        settings = [
+            f"extractor-{EXTRACTION_VERSION}", kind, ocr_version,
+            f"preset-{preset}-{json.dumps(PRESETS[preset], sort_keys=True)}"
+        ]
+        if kind == 'pdf':
+            settings += [
+                f"pypdf2-{PyPDF2.__version__}", f"min-chars-{OCR_MIN_CHARS}", f"dpi-{OCR_DPI}",
+                'pdf2image' if convert_from_path is not None else 'embedded-images'
+            ]
+        return '|'.join(settings)
+    
+    def _iter_single_page(self, extract, document):
+        """Wrap a whole-file extractor as a one-page stream"""
+        started = time.perf_counter()
+        text = extract(document)
+        yield 1, text, time.perf_counter() - started
+    
+    def _iter_image_pages(self, document):
+        """
+        ``(page_number, text, seconds)`` for each frame of an image, in frame order
+        
+        Single-frame images are one page, as before. Every frame of a
+        multi-frame TIFF or GIF is decoded in turn and OCRed on the OCR
+        pool, each page's text starting with a page marker; at most
+        OCR_MAX_FRAMES decoded frames wait in memory, further decoding
+        pauses until the oldest is done.
+        """
         try:
             # Open and process the image
-            image = Image.open(image_path)
-            
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Perform OCR using pytesseract
-            text = pytesseract.image_to_string(image, config='--psm 6')
-            
-            return text.strip()
+            with Image.open(_open_document(document)) as image:
+                frame_count = getattr(image, 'n_frames', 1)
+                if frame_count == 1:
+                    text, seconds = self._timed_ocr(image)
+                    yield 1, text, seconds
+                    return
+                
+                pending = deque()
+                try:
+                    for frame_num in range(frame_count):
+                        if len(pending) >= OCR_MAX_FRAMES:
+                            yield self._frame_result(pending.popleft(), frame_count)
+                        image.seek(frame_num)
+                        # copy() decodes the frame; the file keeps only its position
+                        future = _get_ocr_pool().submit(self._timed_ocr, image.copy())
+                        pending.append((frame_num + 1, future))
+                    while pending:
+                        yield self._frame_result(pending.popleft(), frame_count)
+                finally:
+                    for _, future in pending:
+                        future.cancel()
             
         except Exception as e:
             raise Exception(f"OCR extraction failed: {str(e)}. Make sure pytesseract is properly installed.")
     
-    def _extract_text_from_pdf(self, pdf_path):
-        """Extract text from PDF file"""
+    def _frame_result(self, entry, frame_count):
+        """``(page_number, text, seconds)`` for a queued frame, its text headed by a page marker"""
+        page_number, future = entry
+        text, seconds = future.result()
+        return page_number, f"--- Page {page_number} of {frame_count} ---\n{text}", seconds
+    
+    def _timed_ocr(self, image):
+        """``(text, seconds)`` for OCR of one image"""
+        started = time.perf_counter()
+        text = self._ocr_image(image)
+        return text, time.perf_counter() - started
+    
+    def _ocr_image(self, image):
+        """OCR one PIL image"""
+        # Grayscale, resize, deskew and binarize as the preset says
+        image = preprocess_image(image, self.ocr_preset)
+        
+        # Perform OCR on the warm engine (pytesseract when tesserocr is unavailable)
+        text = self.ocr_engine.recognize(image)
+        
+        return text.strip()
+    
+    def _iter_pdf_pages(self, document, ocr_failures):
+        """
+        ``(page_number, text, seconds)`` for each PDF page, in page order
+        
+        Pages whose text layer is empty or garbage are rasterized and OCRed
+        on the OCR pool while the text layer of later pages is still being
+        read; pages with real text keep the text-layer result. A page is
+        yielded as soon as it and every earlier page are done. Pages whose
+        OCR failed are added to ``ocr_failures``.
+        """
+        pending = deque()
         try:
-            text = ""
-            
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                # Extract text from all pages
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    text += page.extract_text() + "\n"
-            
-            return text.strip()
-            
+            for page_number, text, seconds in self._iter_text_layer(document):
+                if _needs_ocr(text):
+                    future = _get_ocr_pool().submit(self._ocr_pdf_page, document, page_number - 1, text, ocr_failures)
+                    pending.append((page_number, future))
+                else:
+                    pending.append((page_number, (text, seconds)))
+                while pending and (isinstance(pending[0][1], tuple) or pending[0][1].done()):
+                    yield self._page_result(pending.popleft())
+            while pending:
+                yield self._page_result(pending.popleft())
+        finally:
+            for _, result in pending:
+                if not isinstance(result, tuple):
+                    result.cancel()
+    
+    def _page_result(self, entry):
+        """``(page_number, text, seconds)`` for a queued page, waiting on its OCR if any"""
+        page_number, result = entry
+        text, seconds = result if isinstance(result, tuple) else result.result()
+        return page_number, text, seconds
+    
+    def _ocr_pdf_page(self, document, page_num, text_layer, ocr_failures):
+        """
+        ``(text, seconds)`` for OCR of one image-only page
+        
+        The text layer is kept when OCR finds nothing or fails: an image
+        that cannot be decoded (CCITT or JBIG2 scans, broken JPEG data) or
+        a missing tesseract costs this page its OCR, not the document. A
+        failure adds the page number to ``ocr_failures``.
+        """
+        started = time.perf_counter()
+        texts = []
+        try:
+            images = _rasterize_pdf_page(document, page_num)
         except Exception as e:
-            raise Exception(f"PDF extraction failed: {str(e)}")
+            print(f"Could not rasterize PDF page {page_num + 1} for OCR: {e}", file=sys.stderr)
+            ocr_failures.append(page_num + 1)
+            images = []
+        for image in images:
+            try:
+                texts.append(self._ocr_image(image))
+            except Exception as e:
+                print(f"OCR failed on an image of PDF page {page_num + 1}: {e}", file=sys.stderr)
+                ocr_failures.append(page_num + 1)
+        text = "\n".join(text for text in texts if text)
+        return text or text_layer, time.perf_counter() - started
+    
+    def _iter_text_layer(self, document):
+        """
+        ``(page_number, text, seconds)`` from each page's text layer, in page order
+        
+        Large PDFs are split into contiguous page chunks extracted by the
+        shared process pool. Chunks are yielded as soon as they and every
+        earlier chunk are done, so the first pages arrive while later ones
+        are still being extracted. In-memory PDFs are pickled to the
+        workers with every chunk, so they get one chunk per worker.
+        """
+        with _open_document(document) as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            page_count = len(pdf_reader.pages)
+            
+            if page_count < PDF_PARALLEL_MIN_PAGES or PDF_WORKERS < 2:
+                for page_num in range(page_count):
+                    text, seconds = _timed_page_text(pdf_reader.pages[page_num])
+                    yield page_num + 1, text, seconds
+                return
+        
+        if isinstance(document, str):
+            chunk_count = PDF_WORKERS * _CHUNKS_PER_WORKER
+        else:
+            chunk_count = PDF_WORKERS
+        chunk_size = max(1, -(-page_count // chunk_count))
+        pool = _get_pdf_pool()
+        futures = [
+            pool.submit(_extract_pdf_pages, document, start, min(start + chunk_size, page_count))
+            for start in range(0, page_count, chunk_size)
+        ]
+        try:
+            page_number = 0
+            for future in futures:
+                for text, seconds in future.result():
+                    page_number += 1
+                    yield page_number, text, seconds
+        finally:
+            # A consumer that stops early should not leave the pool busy
+            for future in futures:
+                future.cancel()
     
-    def _extract_text_from_text_file(self, text_path):
+    def _extract_text_from_text_file(self, document):
         """Extract text from plain text file"""
         try:
             encodings = ['utf-8', 'utf-16', 'latin-1', 'cp1252']
             
             for encoding in encodings:
                 try:
-                    with open(text_path, 'r', encoding=encoding) as file:
+                    if not isinstance(document, str):
+                        return document.decode(encoding).strip()
+                    with open(document, 'r', encoding=encoding) as file:
                         return file.read().strip()
                 except UnicodeDecodeError:
                     continue
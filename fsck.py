@@ -0,0 +1,354 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+from storage import JOURNAL_SEQ_KEY
+
+# Bytes read from the users file at a time
+CHUNK_SIZE = 1 << 20
+
+# A single user record larger than this is treated as corrupt (runaway string or brace)
+MAX_RECORD_BYTES = int(os.getenv('MEDIASSIST_FSCK_MAX_RECORD_BYTES', str(256 << 20)))
+
+# Where a user record may start: a key, then an object. Field order is not
+# fixed (records lead with schema_version), so candidates are confirmed by
+# their username once parsed; nested objects match too and are rejected
+_RESYNC = re.compile(rb'"((?:[^"\\\r\n]|\\.)*)"\s*:\s*\{')
+
+# Characters that matter while skipping through a string
+_STRING_SPECIAL = re.compile(rb'["\\]')
+
+# Everything up to the next bracket outside a string, complete strings included
+_SKIP_TO_BRACKET = re.compile(rb'(?:[^"{}\[\]]++|"(?:[^"\\]++|\\.)*+")*+')
+_SCALAR_END = re.compile(rb'[,}\n]')
+_WHITESPACE = b' \t\r\n'
+
+
+class FsckIssue:
+    """One problem found in the users file"""
+    
+    def __init__(self, offset, message, key=None):
+        self.offset = offset
+        self.message = message
+        self.key = key
+    
+    def __str__(self):
+        where = f"record {self.key!r} at byte {self.offset}" if self.key is not None else f"byte {self.offset}"
+        return f"{where}: {self.message}"
+
+
+class _CorruptRecord(Exception):
+    """Structural damage at a byte offset; the scanner resyncs past it"""
+    
+    def __init__(self, offset, message, key=None):
+        super().__init__(message)
+        self.issue = FsckIssue(offset, message, key)
+
+
+class _Reader:
+    """Sliding window over a file: absolute offsets, only the unconsumed tail in memory"""
+    
+    def __init__(self, f):
+        self.f = f
+        self.buf = b''
+        self.base = 0
+        self.eof = False
+    
+    def fill(self, pos):
+        """Make sure absolute offset ``pos`` is buffered; False at end of file"""
+        while pos >= self.base + len(self.buf):
+            if self.eof:
+                return False
+            chunk = self.f.read(CHUNK_SIZE)
+            if not chunk:
+                self.eof = True
+                return False
+            self.buf += chunk
+        return True
+    
+    def byte(self, pos):
+        """Byte at absolute offset ``pos``, or None past the end"""
+        if not self.fill(pos):
+            return None
+        return self.buf[pos - self.base]
+    
+    def slice(self, start, end):
+        """Bytes between two buffered absolute offsets"""
+        return self.buf[start - self.base:end - self.base]
+    
+    def search(self, pattern, pos):
+        """Absolute offset of the next ``pattern`` match at or after ``pos``, reading as needed"""
+        while True:
+            if len(self.buf) > MAX_RECORD_BYTES + CHUNK_SIZE:
+                raise _CorruptRecord(pos, f"record exceeds {MAX_RECORD_BYTES} bytes without closing")
+            match = pattern.search(self.buf, max(pos - self.base, 0))
+            if match is not None:
+                return match.start() + self.base
+            if self.eof or not self.fill(self.base + len(self.buf)):
+                return None
+    
+    def resync_search(self, pos):
+        """Offset of the next user record key at or after ``pos``, or None
+        
+        Data behind the scan is discarded as it goes, so skipping a damaged
+        region of any size stays within constant memory.
+        """
+        while True:
+            match = _RESYNC.search(self.buf, max(pos - self.base, 0))
+            if match is not None:
+                return match.start() + self.base
+            if self.eof:
+                return None
+            # Keep a tail so a key split across chunks is still found
+            keep = min(len(self.buf), 4096)
+            dead = len(self.buf) - keep
+            self.buf = self.buf[dead:]
+            self.base += dead
+            pos = max(pos, self.base)
+            if not self.fill(self.base + len(self.buf)):
+                self.eof = True
+    
+    def skip_whitespace(self, pos):
+        """First offset at or after ``pos`` that is not JSON whitespace"""
+        while True:
+            b = self.byte(pos)
+            if b is None or b not in _WHITESPACE:
+                return pos
+            pos += 1
+    
+    def consume(self, pos):
+        """Forget everything before absolute offset ``pos``
+        
+        The buffer is only trimmed once a chunk's worth is dead, so small
+        records do not each pay for copying the window.
+        """
+        if pos - self.base >= CHUNK_SIZE:
+            self.buf = self.buf[pos - self.base:]
+            self.base = pos
+
+
+def _scan_string(reader, pos):
+    """Offset just past the JSON string whose opening quote is at ``pos``"""
+    pos += 1
+    while True:
+        found = reader.search(_STRING_SPECIAL, pos)
+        if found is None:
+            raise _CorruptRecord(pos, 'unterminated string')
+        if reader.byte(found) == ord('\\'):
+            pos = found + 2
+            continue
+        return found + 1
+
+
+def _scan_value(reader, start, key):
+    """Offset just past the JSON value starting at ``start``, tracking brackets and strings"""
+    first = reader.byte(start)
+    if first is None:
+        raise _CorruptRecord(start, 'file ends before the value', key)
+    if first not in b'{[':
+        # Scalar: runs to the next comma or closing brace at this level
+        found = reader.search(_SCALAR_END, start)
+        return found if found is not None else reader.base + len(reader.buf)
+    
+    depth = 0
+    pos = start
+    while True:
+        if pos - start > MAX_RECORD_BYTES or len(reader.buf) > MAX_RECORD_BYTES + CHUNK_SIZE:
+            raise _CorruptRecord(start, f"record exceeds {MAX_RECORD_BYTES} bytes without closing", key)
+        # One C-level regex pass hops over plain text and whole strings
+        found = _SKIP_TO_BRACKET.match(reader.buf, pos - reader.base).end() + reader.base
+        b = reader.byte(found)
+        if b is None:
+            raise _CorruptRecord(start, 'file ends inside the record', key)
+        if b == ord('"'):
+            # A string running past the buffered data: read on and rescan from its quote
+            if not reader.fill(reader.base + len(reader.buf)):
+                raise _CorruptRecord(found, 'unterminated string', key)
+            pos = found
+            continue
+        if b not in b'{}[]':
+            # The pass stopped at the end of the buffered data
+            pos = found
+            continue
+        if b in b'{[':
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return found + 1
+        pos = found + 1
+
+
+def _validate_user(key, value):
+    """Reason a decoded users-file entry is not a usable user record, or None"""
+    if not isinstance(value, dict):
+        return f"expected an object, found {type(value).__name__}"
+    if value.get('username') != key:
+        return f"username field {value.get('username')!r} does not match its key"
+    for field in ('password', 'name', 'role'):
+        if not isinstance(value.get(field), str):
+            return f"missing or non-string {field!r}"
+    if not isinstance(value.get('profile', {}), dict):
+        return "'profile' is not an object"
+    health_data = value.get('health_data', {})
+    if not isinstance(health_data, dict):
+        return "'health_data' is not an object"
+    for section, records in health_data.items():
+        if not isinstance(records, list):
+            return f"health data section {section!r} is not a list"
+    return None
+
+
+def scan_users_file(path):
+    """Validate a users snapshot record by record in constant memory
+    
+    Yields ``(key, raw_bytes, issue)``: raw_bytes is the record's exact JSON
+    text when it is valid (issue None), otherwise None with an ``FsckIssue``
+    naming the offending record and byte offset. A record that is well
+    bracketed but not valid JSON is skipped on its own. After structural
+    damage the scanner resyncs: it tries each following ``"<key>": {`` and
+    carries on from the first whose object has a matching ``username``.
+    """
+    with open(path, 'rb') as f:
+        reader = _Reader(f)
+        # Set after structural damage, until a candidate is confirmed as a user record
+        resyncing = False
+        pos = reader.skip_whitespace(0)
+        if reader.byte(pos) != ord('{'):
+            yield None, None, FsckIssue(pos, 'file does not start with a JSON object')
+            resyncing = True
+            pos = reader.resync_search(pos)
+        else:
+            pos += 1
+        
+        seen = set()
+        while pos is not None:
+            key = None
+            record_start = pos
+            try:
+                pos = reader.skip_whitespace(pos)
+                record_start = pos
+                b = reader.byte(pos)
+                if b is None:
+                    raise _CorruptRecord(pos, 'file ends before the closing brace')
+                if b == ord('}'):
+                    return
+                if b != ord('"'):
+                    raise _CorruptRecord(pos, f"expected a record key, found {chr(b)!r}")
+                key_end = _scan_string(reader, pos)
+                key = json.loads(reader.slice(pos, key_end))
+                pos = reader.skip_whitespace(key_end)
+                if reader.byte(pos) != ord(':'):
+                    raise _CorruptRecord(pos, "expected ':' after the key", key)
+                value_start = reader.skip_whitespace(pos + 1)
+                value_end = _scan_value(reader, value_start, key)
+                raw = reader.slice(value_start, value_end).strip()
+                
+                try:
+                    value = json.loads(raw)
+                except ValueError as exc:
+                    if resyncing:
+                        raise _CorruptRecord(value_start, f"invalid JSON: {exc}", key)
+                    # Brackets balanced, so the record's end is known: skip just this one
+                    value = None
+                    problem = f"invalid JSON: {exc}"
+                else:
+                    if resyncing and not (isinstance(value, dict) and value.get('username') == key):
+                        # A nested object inside the damaged region, not a record
+                        raise _CorruptRecord(value_start, 'not a user record', key)
+                    resyncing = False
+                    if key == JOURNAL_SEQ_KEY:
+                        problem = None if isinstance(value, int) else 'journal sequence is not an integer'
+                    else:
+                        problem = _validate_user(key, value)
+                if problem:
+                    yield key, None, FsckIssue(value_start, problem, key)
+                elif key in seen:
+                    yield key, None, FsckIssue(value_start, 'duplicate key, earlier record kept', key)
+                else:
+                    seen.add(key)
+                    yield key, raw, None
+                
+                pos = reader.skip_whitespace(value_end)
+                b = reader.byte(pos)
+                if b == ord(','):
+                    pos += 1
+                elif b == ord('}'):
+                    return
+                else:
+                    raise _CorruptRecord(pos, "expected ',' or '}' after the record", key)
+                reader.consume(pos)
+            except _CorruptRecord as exc:
+                # Candidates that fail while resyncing were never records; the damage is already reported
+                if not resyncing:
+                    yield exc.issue.key, None, exc.issue
+                resyncing = True
+                pos = reader.resync_search(record_start + 1)
+
+
+def salvage(path, output):
+    """Write every valid record of ``path`` into a fresh snapshot at ``output``
+    
+    Records are copied byte for byte, so nothing is re-encoded and memory
+    stays constant. Returns ``(kept, issues)``.
+    """
+    kept = 0
+    issues = []
+    tmp_path = f"{output}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as out:
+        out.write(b'{')
+        for key, raw, issue in scan_users_file(path):
+            if issue is not None:
+                issues.append(issue)
+                continue
+            if kept:
+                out.write(b',')
+            out.write(b'\n' + json.dumps(key).encode() + b': ' + raw)
+            kept += 1
+        out.write(b'\n}\n')
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp_path, output)
+    return kept, issues
+
+
+def backup_path(path):
+    """Name for a copy of a damaged file kept next to it"""
+    return f"{path}.corrupt-{time.strftime('%Y%m%d-%H%M%S')}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check users_data.json record by record and salvage valid users')
+    parser.add_argument('users_file', nargs='?', default='users_data.json')
+    parser.add_argument('--repair', action='store_true', help='write the valid records to a repaired snapshot')
+    parser.add_argument('--output', help='repaired snapshot path (default: <users_file>.repaired)')
+    parser.add_argument('--in-place', action='store_true',
+                        help='back up the damaged file and replace it with the repaired snapshot')
+    args = parser.parse_args()
+    
+    if args.repair or args.in_place:
+        output = args.output or f"{args.users_file}.repaired"
+        kept, issues = salvage(args.users_file, output)
+        for issue in issues:
+            print(issue)
+        if args.in_place and issues:
+            backup = backup_path(args.users_file)
+            os.replace(args.users_file, backup)
+            os.replace(output, args.users_file)
+            print(f"Kept {kept} records; damaged file moved to {backup}")
+        else:
+            print(f"Kept {kept} records in {output}")
+    else:
+        records = 0
+        issues = 0
+        for key, raw, issue in scan_users_file(args.users_file):
+            if issue is not None:
+                print(issue)
+                issues += 1
+            else:
+                records += 1
+        print(f"{records} valid records, {issues} problems")
+        sys.exit(1 if issues else 0)
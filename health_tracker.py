@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta
 import pytz
+from id_generator import new_id
 
 class HealthTracker:
     """Manages health tracking features"""
@@ -9,7 +10,7 @@ class HealthTracker:
         """Create a medication reminder"""
         est_tz = pytz.timezone('US/Eastern')
         return {
-            'id': f"reminder_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            'id': new_id('reminder'),
             'medicine_name': medicine_name,
             'dosage': dosage,
             'frequency': frequency,
@@ -18,7 +19,8 @@ class HealthTracker:
             'end_date': end_date,
             'active': True,
             'created_at': datetime.now(est_tz).strftime('%Y-%m-%d %H:%M EST'),
-            'history': []
+            'history': [],
+            'history_archived': None
         }
     
     @staticmethod
@@ -39,13 +41,14 @@ class HealthTracker:
         """Create a health goal"""
         est_tz = pytz.timezone('US/Eastern')
         return {
-            'id': f"goal_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            'id': new_id('goal'),
             'goal_type': goal_type,
             'target_value': target_value,
             'current_value': current_value,
             'target_date': target_date,
             'notes': notes,
             'progress': [],
+            'progress_archived': None,
             'status': 'active',
             'created_at': datetime.now(est_tz).strftime('%Y-%m-%d %H:%M EST')
         }
@@ -79,7 +82,7 @@ class HealthTracker:
         """Log a symptom"""
         est_tz = pytz.timezone('US/Eastern')
         return {
-            'id': f"symptom_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            'id': new_id('symptom'),
             'symptom_name': symptom_name,
             'severity': severity,
             'description': description,
@@ -89,9 +92,13 @@ class HealthTracker:
         }
     
     @staticmethod
-    def analyze_symptom_patterns(symptoms):
-        """Analyze patterns in logged symptoms"""
-        if not symptoms:
+    def analyze_symptom_patterns(symptoms, rollup=None):
+        """Analyze patterns in logged symptoms
+        
+        ``rollup`` is the aggregate of archived symptoms, counted alongside
+        the live ones.
+        """
+        if not symptoms and not rollup:
             return {
                 'recurring_symptoms': [],
                 'severity_trends': {},
@@ -100,24 +107,26 @@ class HealthTracker:
         
         # Count symptom occurrences
         symptom_counts = {}
-        severity_by_symptom = {}
+        severity_sums = {}
+        severity_map = {'mild': 1, 'moderate': 2, 'severe': 3}
+        
+        if rollup:
+            for name, stats in rollup['by_name'].items():
+                symptom_counts[name] = stats['count']
+                severity_sums[name] = stats['severity_sum']
         
         for symptom in symptoms:
             name = symptom['symptom_name']
             symptom_counts[name] = symptom_counts.get(name, 0) + 1
-            
-            if name not in severity_by_symptom:
-                severity_by_symptom[name] = []
-            severity_by_symptom[name].append(symptom['severity'])
+            severity_sums[name] = severity_sums.get(name, 0) + severity_map.get(symptom['severity'], 0)
         
         # Find recurring symptoms (3+ occurrences)
         recurring = [name for name, count in symptom_counts.items() if count >= 3]
         
         # Calculate average severity
         severity_trends = {}
-        for name, severities in severity_by_symptom.items():
-            severity_map = {'mild': 1, 'moderate': 2, 'severe': 3}
-            avg_severity = sum(severity_map.get(s, 0) for s in severities) / len(severities)
+        for name, count in symptom_counts.items():
+            avg_severity = severity_sums[name] / count
             severity_trends[name] = 'increasing' if avg_severity > 1.5 else 'stable'
         
         # Generate insights
@@ -0,0 +1,67 @@
+import os
+import threading
+import time
+
+# Crockford base32, the ULID alphabet; lexical order matches numeric order
+_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+# Bits of randomness following the 48-bit millisecond timestamp
+_RANDOM_BITS = 80
+
+
+def _encode(value, length):
+    """Fixed-width Crockford base32 encoding of a non-negative integer"""
+    chars = []
+    for _ in range(length):
+        value, digit = divmod(value, 32)
+        chars.append(_ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+class IdGenerator:
+    """Monotonic ULID-style ids: 48-bit millisecond time then 80 random bits
+    
+    Ids are 26 characters that sort lexically in creation order. Within one
+    millisecond (or if the clock steps back) the random part is incremented
+    instead of redrawn, so ids from one process never collide or go
+    backwards, and ids from different processes differ in 80 random bits.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._last_random = 0
+    
+    def new_ulid(self):
+        """Next bare 26-character id"""
+        with self._lock:
+            now_ms = time.time_ns() // 1_000_000
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._last_random = int.from_bytes(os.urandom(_RANDOM_BITS // 8), 'big')
+            else:
+                self._last_random += 1
+                if self._last_random >> _RANDOM_BITS:
+                    # Random part exhausted within one millisecond: borrow the next one
+                    self._last_ms += 1
+                    self._last_random = 0
+            return _encode(self._last_ms, 10) + _encode(self._last_random, 16)
+
+
+# Shared by every caller in the process, which keeps ids monotonic across modules
+_generator = IdGenerator()
+
+
+def new_id(prefix=None):
+    """Next id, as ``<prefix>_<ulid>`` when a prefix is given"""
+    ulid = _generator.new_ulid()
+    return f"{prefix}_{ulid}" if prefix else ulid
+
+
+def id_timestamp(record_id):
+    """Creation time (epoch seconds) encoded in an id from ``new_id``"""
+    ulid = record_id.rsplit('_', 1)[-1]
+    value = 0
+    for char in ulid[:10].upper():
+        value = value * 32 + _ALPHABET.index(char)
+    return value / 1000
@@ -0,0 +1,164 @@
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import Future
+
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# 'auto' prefers the warm tesserocr pool and falls back to pytesseract; or name one
+OCR_ENGINE = os.getenv('MEDIASSIST_OCR_ENGINE', 'auto')
+
+# Tesseract language data loaded by every worker
+OCR_LANG = os.getenv('MEDIASSIST_OCR_LANG', 'eng')
+
+# Images OCRed at once; each warm worker holds its own copy of the language data
+OCR_CONCURRENCY = int(os.getenv('MEDIASSIST_OCR_CONCURRENCY', '0')) or os.cpu_count() or 1
+
+# Jobs waiting for a worker before submitters block
+OCR_QUEUE_SIZE = int(os.getenv('MEDIASSIST_OCR_QUEUE_SIZE', '64'))
+
+
+class OcrEngine:
+    """Turns a PIL image into text; implementations bound how many run at once"""
+    
+    name = 'base'
+    
+    def recognize(self, image):
+        """Text of one image (page segmentation: a single uniform block)"""
+        raise NotImplementedError
+    
+    def version(self):
+        """Engine and tesseract version, part of extraction cache keys"""
+        raise NotImplementedError
+    
+    def close(self):
+        """Release workers; the engine is unusable afterwards"""
+
+
+class PytesseractEngine(OcrEngine):
+    """The original path: one tesseract process, and temp files, per image"""
+    
+    name = 'pytesseract'
+    
+    def __init__(self, lang=OCR_LANG, concurrency=OCR_CONCURRENCY):
+        self.lang = lang
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._version = None
+    
+    def recognize(self, image):
+        with self._slots:
+            return pytesseract.image_to_string(image, lang=self.lang, config='--psm 6')
+    
+    def version(self):
+        if self._version is None:
+            # Asking tesseract for its version starts a process; do it once
+            self._version = f"pytesseract-{pytesseract.get_tesseract_version()}-{self.lang}"
+        return self._version
+
+
+class TesserocrPoolEngine(OcrEngine):
+    """Long-lived tesserocr workers, each loading the language data once
+    
+    Jobs go through a bounded queue to ``concurrency`` worker threads; each
+    worker owns one ``PyTessBaseAPI`` for its whole life, so no process is
+    started and no model is reloaded per image. tesserocr releases the GIL
+    while recognizing, so the workers run in parallel.
+    """
+    
+    name = 'tesserocr'
+    
+    def __init__(self, lang=OCR_LANG, concurrency=OCR_CONCURRENCY, queue_size=OCR_QUEUE_SIZE):
+        if tesserocr is None:
+            raise RuntimeError('tesserocr is not installed')
+        self.lang = lang
+        self._jobs = queue.Queue(maxsize=queue_size)
+        self._workers = []
+        ready = []
+        for n in range(concurrency):
+            started = Future()
+            worker = threading.Thread(target=self._work, args=(started,), name=f"ocr-worker-{n}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+            ready.append(started)
+        # Surface a missing tessdata here, not on the first upload
+        try:
+            for started in ready:
+                started.result()
+        except Exception:
+            self.close()
+            raise
+    
+    def _work(self, started):
+        """Worker loop: one API instance serving jobs until ``close``"""
+        try:
+            api = tesserocr.PyTessBaseAPI(lang=self.lang, psm=tesserocr.PSM.SINGLE_BLOCK)
+        except Exception as e:
+            started.set_exception(e)
+            return
+        started.set_result(None)
+        with api:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    return
+                image, result = job
+                if not result.set_running_or_notify_cancel():
+                    continue
+                try:
+                    api.SetImage(image)
+                    result.set_result(api.GetUTF8Text())
+                except Exception as e:
+                    result.set_exception(e)
+                finally:
+                    api.Clear()
+    
+    def submit(self, image):
+        """Queue an image; returns a Future of its text (blocks while the queue is full)"""
+        result = Future()
+        self._jobs.put((image, result))
+        return result
+    
+    def recognize(self, image):
+        return self.submit(image).result()
+    
+    def version(self):
+        return f"tesserocr-{tesserocr.tesseract_version().split()[1]}-{self.lang}"
+    
+    def close(self):
+        for _ in self._workers:
+            self._jobs.put(None)
+        for worker in self._workers:
+            worker.join()
+
+
+def create_ocr_engine(kind=OCR_ENGINE):
+    """Engine named by ``kind``; 'auto' falls back to pytesseract when the pool cannot start"""
+    if kind == 'pytesseract':
+        return PytesseractEngine()
+    try:
+        return TesserocrPoolEngine()
+    except Exception as e:
+        if kind == 'tesserocr':
+            raise
+        # tesserocr is optional; say so either way, since pytesseract starts a process per image
+        print(f"tesserocr pool unavailable ({e}); using pytesseract, one tesseract process per image", file=sys.stderr)
+        return PytesseractEngine()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_ocr_engine():
+    """Engine shared by every FileProcessor in the process, created on first use"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = create_ocr_engine()
+        return _engine
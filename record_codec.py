@@ -0,0 +1,127 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Compact output by default; indented files are handy when reading them by hand,
+# but cost time with stdlib json (orjson is optional and not always installed)
+PRETTY = os.getenv('MEDIASSIST_PRETTY_JSON', '0') == '1'
+
+# Report fields holding live datetime objects
+REPORT_DATETIME_FIELDS = ('datetime_obj',)
+
+# Report 'date' strings are written in US Eastern standard time
+_REPORT_DATE_TZ = timezone(timedelta(hours=-5), 'EST')
+
+
+def _default(obj):
+    """Encode values stdlib json cannot handle"""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj, pretty=None):
+    """Serialize user data to a JSON string, encoding datetimes as ISO-8601
+
+    Uses orjson when it is installed and compact stdlib json otherwise;
+    ``pretty`` defaults to the module-wide ``PRETTY`` setting.
+    """
+    if pretty is None:
+        pretty = PRETTY
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 if pretty else 0
+        return orjson.dumps(obj, default=_default, option=option).decode('utf-8')
+    if pretty:
+        return json.dumps(obj, indent=2, default=_default)
+    return json.dumps(obj, separators=(',', ':'), default=_default)
+
+
+def loads(text):
+    """Parse JSON text or bytes without any type decoding"""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def decode_datetime(value):
+    """Turn an encoded datetime (ISO string or epoch seconds) into a tz-aware datetime"""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def decode_report(report):
+    """Restore datetime fields of a report record in place"""
+    for field in REPORT_DATETIME_FIELDS:
+        value = report.get(field)
+        if value is not None:
+            try:
+                report[field] = decode_datetime(value)
+            except (TypeError, ValueError):
+                # Garbage from the pre-codec era; the date string still works
+                del report[field]
+    return report
+
+
+def decode_section(data_type, records):
+    """Restore typed fields of one health data section in place"""
+    if data_type == 'reports':
+        for report in records:
+            decode_report(report)
+    return records
+
+
+def decode_user(user):
+    """Restore typed fields of a full user record in place"""
+    for data_type, records in user.get('health_data', {}).items():
+        decode_section(data_type, records)
+    return user
+
+
+def decode_users(users):
+    """Restore typed fields of every record in a username -> user mapping"""
+    for user in users.values():
+        if isinstance(user, dict):
+            decode_user(user)
+    return users
+
+
+def decode_record(record):
+    """Restore typed fields of a storage journal record in place"""
+    op = record['op']
+    if op == 'create_user':
+        decode_user(record['data'])
+    elif op == 'update_health_data':
+        for data_type, records in record['data'].items():
+            decode_section(data_type, records)
+    elif op == 'add_health_data' and record['data_type'] == 'reports':
+        decode_report(record['data'])
+    return record
+
+
+def parse_report_date(date_string):
+    """Tz-aware datetime for a report 'date' string like '2025-01-31 09:30 EST', or None"""
+    try:
+        parsed = datetime.strptime(date_string[:16], '%Y-%m-%d %H:%M')
+    except (TypeError, ValueError):
+        return None
+    return parsed.replace(tzinfo=_REPORT_DATE_TZ)
+
+
+def report_timestamp(report):
+    """Epoch seconds a report is filed under, from datetime_obj or its 'date' string"""
+    value = report.get('datetime_obj')
+    if isinstance(value, datetime):
+        return value.timestamp()
+    parsed = parse_report_date(report.get('date', ''))
+    return parsed.timestamp() if parsed else 0.0
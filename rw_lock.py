@@ -0,0 +1,84 @@
+import threading
+from contextlib import contextmanager
+
+class ReadWriteLock:
+    """Many concurrent readers or one writer, with waiting writers served first
+    
+    Both sides are reentrant for the thread holding them, and a writer may
+    take read locks while it holds the write lock. Upgrading a read lock to a
+    write lock is not supported and would deadlock.
+    """
+    
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+        self._local = threading.local()
+    
+    def acquire_read(self):
+        """Block until no writer holds or waits for the lock, then share it"""
+        depth = getattr(self._local, 'read_depth', 0)
+        if depth or self._writer == threading.get_ident():
+            # Already inside a read or write section on this thread
+            self._local.read_depth = depth + 1
+            return
+        with self._cond:
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        self._local.read_depth = 1
+    
+    def release_read(self):
+        """Leave a read section"""
+        depth = self._local.read_depth - 1
+        self._local.read_depth = depth
+        if depth or self._writer == threading.get_ident():
+            return
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+    
+    def acquire_write(self):
+        """Block until every reader and any other writer has left"""
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+    
+    def release_write(self):
+        """Leave a write section, waking readers and writers once fully released"""
+        with self._cond:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._cond.notify_all()
+    
+    @contextmanager
+    def read_locked(self):
+        """``with lock.read_locked():`` shared section"""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+    
+    @contextmanager
+    def write_locked(self):
+        """``with lock.write_locked():`` exclusive section"""
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
@@ -0,0 +1,164 @@
+import threading
+import time
+from datetime import datetime, timezone
+
+import record_codec
+from id_generator import new_id
+
+# Version stamped on user records written by this build
+SCHEMA_VERSION = 5
+
+# Record key holding the version a user record conforms to
+VERSION_KEY = 'schema_version'
+
+# Health data sections every current user record carries
+HEALTH_SECTIONS = (
+    'reports', 'prescriptions', 'appointments', 'symptoms', 'health_goals', 'medication_reminders',
+    'symptom_rollups'
+)
+
+# Profile fields every current user record carries, with their defaults
+PROFILE_DEFAULTS = {
+    'age': None,
+    'gender': None,
+    'blood_type': None,
+    'allergies': [],
+    'emergency_contact': None
+}
+
+# Report fields every current report carries, with their defaults
+REPORT_DEFAULTS = {
+    'filename': 'Unknown',
+    'summary': '',
+    'concerns': [],
+    'recommendations': [],
+    'metrics': [],
+    'downloaded': False
+}
+
+# Pause between users in the background sweep, so it never hogs the write lock
+SWEEP_PAUSE = 0.01
+
+# from_version -> function upgrading a user record in place to from_version + 1
+MIGRATIONS = {}
+
+
+def migration(from_version):
+    """Register the function that upgrades records from ``from_version``"""
+    def register(func):
+        MIGRATIONS[from_version] = func
+        return func
+    return register
+
+
+def record_version(user):
+    """Schema version of a user record; records from before versioning are 0"""
+    return user.get(VERSION_KEY, 0)
+
+
+def needs_upgrade(user):
+    """Whether a user record is older than this build's schema"""
+    return record_version(user) < SCHEMA_VERSION
+
+
+def upgrade_user(user):
+    """Run every pending migration on a user record in place
+    
+    Returns True when the record changed and has to be written back.
+    """
+    version = record_version(user)
+    if version >= SCHEMA_VERSION:
+        return False
+    while version < SCHEMA_VERSION:
+        MIGRATIONS[version](user)
+        version += 1
+    user[VERSION_KEY] = version
+    return True
+
+
+@migration(0)
+def _add_missing_sections(user):
+    """Builds before medication reminders and goals lacked those sections"""
+    health_data = user.setdefault('health_data', {})
+    for section in HEALTH_SECTIONS:
+        health_data.setdefault(section, [])
+    profile = user.setdefault('profile', {})
+    for field, default in PROFILE_DEFAULTS.items():
+        profile.setdefault(field, list(default) if isinstance(default, list) else default)
+
+
+@migration(1)
+def _normalize_reports(user):
+    """Give every report a datetime_obj and the list fields pages iterate"""
+    for report in user['health_data']['reports']:
+        if not isinstance(report.get('datetime_obj'), datetime):
+            report['datetime_obj'] = (
+                record_codec.parse_report_date(report.get('date'))
+                or datetime.fromtimestamp(0, tz=timezone.utc)
+            )
+        report.setdefault('date', report['datetime_obj'].strftime('%Y-%m-%d %H:%M EST'))
+        for field, default in REPORT_DEFAULTS.items():
+            if report.get(field) is None:
+                report[field] = list(default) if isinstance(default, list) else default
+
+
+@migration(2)
+def _move_extracted_text_to_blobs(user):
+    """Reports saved before the blob store kept their extracted text inline"""
+    from blob_store import BlobStore
+    blob_store = None
+    for report in user['health_data']['reports']:
+        if 'extracted_text' in report:
+            if blob_store is None:
+                blob_store = BlobStore()
+            report['extracted_text_hash'] = blob_store.put(report.pop('extracted_text') or '')
+        else:
+            report.setdefault('extracted_text_hash', None)
+
+
+@migration(3)
+def _add_archive_rollups(user):
+    """Rollup slots the cold archive fills in when it moves old items out"""
+    health_data = user['health_data']
+    health_data.setdefault('symptom_rollups', [])
+    for reminder in health_data['medication_reminders']:
+        reminder.setdefault('history_archived', None)
+    for goal in health_data['health_goals']:
+        goal.setdefault('progress_archived', None)
+
+
+@migration(4)
+def _renumber_duplicate_ids(user):
+    """Second-resolution legacy ids (``reminder_%Y%m%d_%H%M%S``) collide; give repeats fresh ids
+    
+    Updates and archive streams find records by id, so of each duplicate
+    only the first keeps it. Items archived before this ran stay under the
+    old id, with the first record.
+    """
+    for records in user['health_data'].values():
+        seen = set()
+        for record in records:
+            record_id = record.get('id') if isinstance(record, dict) else None
+            if record_id is None:
+                continue
+            if record_id in seen:
+                prefix = record_id.split('_', 1)[0] if '_' in record_id else None
+                record['id'] = new_id(prefix)
+            seen.add(record['id'])
+
+
+def start_background_sweep(manager, pause=SWEEP_PAUSE):
+    """Upgrade every stored user record on a daemon thread
+    
+    Each outdated user goes through ``manager.ensure_current``, the same
+    path lazy upgrades take, so a record is never migrated twice.
+    """
+    def sweep():
+        for user in manager.storage.iter_users():
+            if user is not None and needs_upgrade(user):
+                manager.ensure_current(user['username'])
+                time.sleep(pause)
+    
+    thread = threading.Thread(target=sweep, name='schema-sweep', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,1228 @@
+import argparse
+import atexit
+import bisect
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import record_codec
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Snapshot key holding the last journal sequence number folded into it
+JOURNAL_SEQ_KEY = '__journal_seq__'
+
+# Health data sections and the SQLite table each one lives in
+HEALTH_TABLES = {
+    'reports': 'reports',
+    'prescriptions': 'prescriptions',
+    'appointments': 'appointments',
+    'medication_reminders': 'reminders',
+    'health_goals': 'goals',
+    'symptoms': 'symptoms',
+    'symptom_rollups': 'symptom_rollups'
+}
+
+
+# Storages with possibly unflushed writes, flushed at interpreter exit
+_open_storages = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_open_storages():
+    for storage in list(_open_storages):
+        storage.flush()
+
+
+def _atomic_write(path, content):
+    """Replace ``path`` with ``content`` via temp file, fsync and rename
+
+    A crash at any point leaves either the old or the new file in place,
+    never a truncated one.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def _apply_record(users, record):
+    """Apply a single journal record to an in-memory users dict"""
+    op = record['op']
+    username = record['username']
+    
+    if op == 'create_user':
+        users[username] = record['data']
+    elif username not in users:
+        return
+    elif op == 'update_profile':
+        users[username]['profile'].update(record['data'])
+    elif op == 'update_health_data':
+        users[username]['health_data'].update(record['data'])
+    elif op == 'add_health_data':
+        health_data = users[username]['health_data']
+        health_data.setdefault(record['data_type'], []).append(record['data'])
+
+
+def _member_summary(user, reports_count, prescriptions_count):
+    """Family page summary of one member"""
+    return {
+        'username': user['username'],
+        'name': user['name'],
+        'role': user['role'],
+        'profile': user.get('profile', {}),
+        'reports_count': reports_count,
+        'prescriptions_count': prescriptions_count
+    }
+
+
+def _timestamp(value):
+    """Epoch seconds for a datetime bound, passing numbers and None through"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return value.timestamp()
+
+
+def _encode_cursor(key):
+    """Opaque paging cursor for a (timestamp, report id) sort key"""
+    return f"{key[0]!r}|{key[1]}"
+
+
+def _decode_cursor(cursor):
+    """Sort key encoded by _encode_cursor"""
+    ts, report_id = cursor.split('|', 1)
+    return (float(ts), report_id)
+
+
+class _ReportIndex:
+    """One user's reports kept sorted by (report datetime, report id)"""
+    
+    def __init__(self, reports):
+        entries = sorted(
+            ((record_codec.report_timestamp(report), str(report.get('id', ''))), position)
+            for position, report in enumerate(reports)
+        )
+        self.keys = [key for key, _ in entries]
+        self.reports = [reports[position] for _, position in entries]
+    
+    def add(self, report):
+        """Insert a newly stored report at its sorted position"""
+        key = (record_codec.report_timestamp(report), str(report.get('id', '')))
+        position = bisect.bisect_right(self.keys, key)
+        self.keys.insert(position, key)
+        self.reports.insert(position, report)
+    
+    def query(self, start=None, end=None, limit=None, offset=0, cursor=None, newest_first=False):
+        """Reports with start <= datetime < end, paged by limit/offset or cursor"""
+        lo = 0 if start is None else bisect.bisect_left(self.keys, (_timestamp(start), ''))
+        hi = len(self.keys) if end is None else bisect.bisect_left(self.keys, (_timestamp(end), ''))
+        if cursor:
+            key = _decode_cursor(cursor)
+            if newest_first:
+                hi = min(hi, bisect.bisect_left(self.keys, key))
+            else:
+                lo = max(lo, bisect.bisect_right(self.keys, key))
+        
+        if newest_first:
+            stop = hi - offset
+            first = stop - limit if limit is not None else lo
+            positions = range(stop - 1, max(first, lo) - 1, -1)
+        else:
+            first = lo + offset
+            stop = min(first + limit, hi) if limit is not None else hi
+            positions = range(first, stop)
+        
+        reports = [self.reports[i] for i in positions]
+        next_cursor = None
+        if positions and (positions[-1] > lo if newest_first else positions[-1] < hi - 1):
+            next_cursor = _encode_cursor(self.keys[positions[-1]])
+        return reports, next_cursor
+
+
+class StorageBackend:
+    """Interface implemented by every AuthManager storage engine"""
+    
+    def has_user(self, username):
+        """Whether the username is taken"""
+        raise NotImplementedError
+    
+    def user_count(self):
+        """Number of stored users"""
+        raise NotImplementedError
+    
+    def get_user(self, username):
+        """Full user record, or None"""
+        raise NotImplementedError
+    
+    def put_user(self, username, user):
+        """Insert or replace a full user record"""
+        raise NotImplementedError
+    
+    def update_profile(self, username, profile_data):
+        """Merge fields into the user profile"""
+        raise NotImplementedError
+    
+    def update_health_data(self, username, health_data):
+        """Replace the given health data sections"""
+        raise NotImplementedError
+    
+    def append_health_data(self, username, data_type, data):
+        """Append one record to a health data section"""
+        raise NotImplementedError
+    
+    def get_health_data(self, username, data_type=None):
+        """One health data section, or all of them"""
+        raise NotImplementedError
+    
+    def get_family_members(self, family_id):
+        """User records sharing a family id"""
+        raise NotImplementedError
+    
+    def get_family_summaries(self, family_id):
+        """Per-member identity plus report and prescription counts, in one pass"""
+        summaries = []
+        for user in self.get_family_members(family_id):
+            health_data = user.get('health_data') or {}
+            summaries.append(_member_summary(
+                user,
+                len(health_data.get('reports', [])),
+                len(health_data.get('prescriptions', []))
+            ))
+        return summaries
+    
+    def query_reports(self, username, start=None, end=None, limit=None, offset=0, cursor=None,
+                      newest_first=False):
+        """Reports filed in [start, end), ordered by report datetime
+        
+        Returns ``(reports, next_cursor)``; pass ``next_cursor`` back to get
+        the following page, it is None once the range is exhausted.
+        """
+        reports = self.get_health_data(username, 'reports') or []
+        return _ReportIndex(reports).query(start, end, limit, offset, cursor, newest_first)
+    
+    def report_totals(self, username):
+        """Counts over all of a user's reports: ``reports``, ``concerns`` and ``recommendations``"""
+        reports = self.get_health_data(username, 'reports') or []
+        return {
+            'reports': len(reports),
+            'concerns': sum(len(report.get('concerns') or []) for report in reports),
+            'recommendations': sum(len(report.get('recommendations') or []) for report in reports),
+        }
+    
+    def iter_users(self):
+        """Iterate over every user record"""
+        raise NotImplementedError
+    
+    def import_batch(self, users, records, checkpoint=None):
+        """Bulk load: upsert full user records, then append (username, data_type, data) records
+        
+        Engines override this to commit the whole batch in one write.
+        ``checkpoint`` is an optional ``(name, offset)`` progress marker;
+        engines that commit it atomically with the batch return True (read it
+        back with ``import_checkpoint``), the rest ignore it and return False.
+        """
+        for user in users:
+            self.put_user(user['username'], user)
+        for username, data_type, data in records:
+            self.append_health_data(username, data_type, data)
+        self.flush()
+        return False
+    
+    def import_checkpoint(self, name):
+        """Offset last committed by ``import_batch`` under ``name``, or None"""
+        return None
+    
+    def clear_import_checkpoint(self, name):
+        """Forget the progress marker ``name``"""
+        pass
+    
+    @contextmanager
+    def bulk_import(self):
+        """Scope of a multi-batch ``import_batch`` run; engines defer housekeeping to its end"""
+        yield
+    
+    def flush(self):
+        """Write out any buffered mutations"""
+        pass
+    
+    def close(self):
+        """Release files and connections"""
+        pass
+
+
+class _ProcessFileLock:
+    """Reentrant exclusive advisory lock on a side file, shared across processes
+
+    Callers hold the owning storage's thread lock, which keeps the nesting
+    counter consistent. Without ``fcntl`` (non-POSIX) it degrades to a no-op.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._depth = 0
+    
+    def __enter__(self):
+        if self._depth == 0 and fcntl is not None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self._depth += 1
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        return False
+
+
+class JSONFileStorage(StorageBackend):
+    """Users kept in memory and persisted to a JSON snapshot plus journal"""
+    
+    def __init__(self, users_file='users_data.json', journal=True, compact_threshold=500,
+                 flush_delay=0.25):
+        """
+        In journal mode every mutation is appended to ``<users_file>.journal``
+        instead of rewriting the whole users file; the journal is folded back
+        into the snapshot by a background compaction once it holds
+        ``compact_threshold`` records.
+        
+        Mutations are buffered for ``flush_delay`` seconds so a burst of them
+        reaches disk in a single write; ``flush()`` forces it immediately and
+        a delay of 0 writes synchronously.
+        
+        Several processes may share the same files: writes are serialized by
+        an advisory lock on ``<users_file>.lock``, and reads first check the
+        snapshot signature and journal size, replaying only what other
+        processes appended since the last look.
+        """
+        self.users_file = users_file
+        self.journal_file = f"{users_file}.journal"
+        self.journal_enabled = journal
+        self.compact_threshold = compact_threshold
+        self.flush_delay = flush_delay
+        self.flush_count = 0
+        self.reload_count = 0
+        self._lock = threading.RLock()
+        self._file_lock = _ProcessFileLock(f"{users_file}.lock")
+        self._pending = []
+        self._flush_timer = None
+        self._journal_seq = 0
+        self._journal_records = 0
+        self._journal_offset = 0
+        self._snapshot_sig = None
+        self._compacting = False
+        # Nesting depth of bulk_import(); compaction waits until it is back to 0
+        self._bulk_depth = 0
+        self.users = {}
+        self._family_index = {}
+        self._report_indexes = {}
+        self._reload()
+        _open_storages.add(self)
+    
+    @staticmethod
+    def _file_signature(path):
+        """Cheap change marker for a file: (mtime, size, inode), or None"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    
+    def _load_users(self):
+        """Load users from the JSON snapshot and replay the journal on top"""
+        self._snapshot_sig = self._file_signature(self.users_file)
+        users = {}
+        if os.path.exists(self.users_file):
+            try:
+                with open(self.users_file, 'rb') as f:
+                    users = record_codec.decode_users(record_codec.loads(f.read()))
+            except ValueError:
+                users = self._salvage_users()
+        
+        self._journal_seq = users.pop(JOURNAL_SEQ_KEY, 0)
+        self._journal_records = 0
+        self._journal_offset = 0
+        if os.path.exists(self.journal_file):
+            self._replay_journal(users)
+        return users
+    
+    def _salvage_users(self):
+        """Recover every intact user from a damaged snapshot instead of starting empty
+        
+        The damaged file is kept next to the snapshot and replaced by the
+        salvaged one; see ``fsck.py`` for the offline checker.
+        """
+        import fsck
+        with self._file_lock:
+            backup = fsck.backup_path(self.users_file)
+            repaired = f"{self.users_file}.repaired"
+            kept, issues = fsck.salvage(self.users_file, repaired)
+            for issue in issues:
+                print(f"{self.users_file}: {issue}", file=sys.stderr)
+            os.replace(self.users_file, backup)
+            os.replace(repaired, self.users_file)
+            print(f"{self.users_file}: salvaged {kept} records, damaged file kept as {backup}", file=sys.stderr)
+        self._snapshot_sig = self._file_signature(self.users_file)
+        with open(self.users_file, 'rb') as f:
+            return record_codec.decode_users(record_codec.loads(f.read()))
+    
+    def _replay_journal(self, users, offset=0):
+        """Apply journal records newer than the snapshot, starting at byte ``offset``
+        
+        Returns the records that were applied.
+        """
+        applied = []
+        with open(self.journal_file, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # A torn final line from an interrupted append
+                    break
+                try:
+                    record = record_codec.decode_record(record_codec.loads(line))
+                except ValueError:
+                    break
+                offset += len(line)
+                self._journal_records += 1
+                if record['seq'] <= self._journal_seq:
+                    continue
+                _apply_record(users, record)
+                self._journal_seq = record['seq']
+                applied.append(record)
+        self._journal_offset = offset
+        return applied
+    
+    def _reload(self):
+        """Rebuild in-memory state from disk, keeping our own unflushed mutations"""
+        users = self._load_users()
+        for body in self._pending:
+            _apply_record(users, record_codec.decode_record(record_codec.loads(body)))
+        self.users = users
+        self._report_indexes = {}
+        self._family_index = {}
+        for username, user in users.items():
+            self._index_family(username, user.get('family_id'))
+        self.reload_count += 1
+    
+    def _refresh(self):
+        """Pick up writes other processes made since we last looked"""
+        with self._lock:
+            if self._file_signature(self.users_file) != self._snapshot_sig:
+                self._reload()
+                return
+            
+            journal_sig = self._file_signature(self.journal_file)
+            journal_size = journal_sig[1] if journal_sig else 0
+            if journal_size == self._journal_offset:
+                return
+            if journal_size < self._journal_offset or self._pending:
+                # Rewritten underneath us, or foreign records must be ordered
+                # before our buffered ones
+                self._reload()
+                return
+            for record in self._replay_journal(self.users, self._journal_offset):
+                self._report_indexes.pop(record['username'], None)
+                if record['op'] == 'create_user':
+                    self._index_family(record['username'], record['data'].get('family_id'))
+    
+    def _snapshot_content(self):
+        """Serialize users plus the journal position they already include"""
+        snapshot = dict(self.users)
+        snapshot[JOURNAL_SEQ_KEY] = self._journal_seq
+        return record_codec.dumps(snapshot)
+    
+    def _save_users(self):
+        """Save users to JSON file"""
+        _atomic_write(self.users_file, self._snapshot_content())
+        self._snapshot_sig = self._file_signature(self.users_file)
+    
+    def _persist(self, record):
+        """Buffer a mutation that has already been applied in memory"""
+        with self._lock:
+            # Serialize now: the live objects may change again before the
+            # flush, and replaying that later state would apply it twice
+            self._pending.append(record_codec.dumps(record, pretty=False))
+            if not self.flush_delay:
+                self.flush()
+            elif self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+    
+    def flush(self):
+        """Write all buffered mutations to disk in one go"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._pending:
+                return
+            
+            with self._file_lock:
+                self._refresh()
+                pending, self._pending = self._pending, []
+                
+                if not self.journal_enabled:
+                    self._save_users()
+                    self.flush_count += 1
+                    return
+                
+                journal_sig = self._file_signature(self.journal_file)
+                if journal_sig and journal_sig[1] > self._journal_offset:
+                    # Drop a torn tail left by a crashed writer
+                    os.truncate(self.journal_file, self._journal_offset)
+                
+                # Sequence numbers are assigned under the file lock so that
+                # processes sharing the journal never reuse one
+                lines = []
+                for body in pending:
+                    self._journal_seq += 1
+                    lines.append(f'{{"seq": {self._journal_seq}, {body[1:]}\n')
+                with open(self.journal_file, 'ab') as f:
+                    f.write(''.join(lines).encode())
+                    f.flush()
+                    os.fsync(f.fileno())
+                    self._journal_offset = f.tell()
+                self._journal_records += len(pending)
+                self.flush_count += 1
+            
+            if self._journal_records >= self.compact_threshold and not self._compacting and not self._bulk_depth:
+                self._compacting = True
+                threading.Thread(target=self.compact, daemon=True).start()
+    
+    @contextmanager
+    def bulk_import(self):
+        """Defer compaction to the end of an import
+        
+        Every batch journals at least its own records, so past
+        ``compact_threshold`` each one would otherwise rewrite the whole
+        snapshot; instead the journal grows for the whole import and is
+        compacted once when the outermost block exits.
+        """
+        with self._lock:
+            self._bulk_depth += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._bulk_depth -= 1
+                compact = not self._bulk_depth and not self._compacting
+                if compact:
+                    self.flush()
+                    compact = self._journal_records >= self.compact_threshold
+                    self._compacting = compact
+            if compact:
+                self.compact()
+    
+    def compact(self):
+        """Fold the journal into a fresh snapshot and empty the journal"""
+        try:
+            with self._lock, self._file_lock:
+                self.flush()
+                self._refresh()
+                self._save_users()
+                # No other writer can append while we hold the file lock, and
+                # the snapshot's sequence number makes a crash here harmless
+                _atomic_write(self.journal_file, '')
+                self._journal_offset = 0
+                self._journal_records = 0
+        finally:
+            self._compacting = False
+    
+    def _index_family(self, username, family_id, previous_family_id=None):
+        """Keep the family_id -> usernames index in step with a user record"""
+        if previous_family_id is not None and previous_family_id != family_id:
+            members = self._family_index.get(previous_family_id, [])
+            if username in members:
+                members.remove(username)
+        members = self._family_index.setdefault(family_id, [])
+        if username not in members:
+            members.append(username)
+    
+    def has_user(self, username):
+        self._refresh()
+        return username in self.users or username == JOURNAL_SEQ_KEY
+    
+    def user_count(self):
+        self._refresh()
+        return len(self.users)
+    
+    def get_user(self, username):
+        self._refresh()
+        return self.users.get(username)
+    
+    def put_user(self, username, user):
+        with self._lock:
+            self._refresh()
+            previous = self.users.get(username)
+            self.users[username] = user
+            self._report_indexes.pop(username, None)
+            self._index_family(username, user.get('family_id'), previous and previous.get('family_id'))
+            self._persist({'op': 'create_user', 'username': username, 'data': user})
+    
+    def update_profile(self, username, profile_data):
+        with self._lock:
+            self._refresh()
+            if username not in self.users:
+                return False
+            self.users[username]['profile'].update(profile_data)
+            self._persist({'op': 'update_profile', 'username': username, 'data': profile_data})
+        return True
+    
+    def update_health_data(self, username, health_data):
+        with self._lock:
+            self._refresh()
+            if username not in self.users:
+                return False
+            self.users[username]['health_data'].update(health_data)
+            if 'reports' in health_data:
+                self._report_indexes.pop(username, None)
+            self._persist({'op': 'update_health_data', 'username': username, 'data': health_data})
+        return True
+    
+    def append_health_data(self, username, data_type, data):
+        with self._lock:
+            self._refresh()
+            if username not in self.users:
+                return False
+            # Bulk imports put users as they come, without upgrading them to the current schema
+            self.users[username]['health_data'].setdefault(data_type, []).append(data)
+            if data_type == 'reports' and username in self._report_indexes:
+                self._report_indexes[username].add(data)
+            self._persist({
+                'op': 'add_health_data',
+                'username': username,
+                'data_type': data_type,
+                'data': data
+            })
+        return True
+    
+    def get_health_data(self, username, data_type=None):
+        self._refresh()
+        if username not in self.users:
+            return None
+        
+        health_data = self.users[username].get('health_data', {})
+        if data_type:
+            return health_data.get(data_type, [])
+        return health_data
+    
+    def get_family_members(self, family_id):
+        self._refresh()
+        return [self.users[username] for username in self._family_index.get(family_id, [])]
+    
+    def query_reports(self, username, start=None, end=None, limit=None, offset=0, cursor=None,
+                      newest_first=False):
+        with self._lock:
+            self._refresh()
+            if username not in self.users:
+                return [], None
+            index = self._report_indexes.get(username)
+            if index is None:
+                index = _ReportIndex(self.users[username]['health_data'].get('reports', []))
+                self._report_indexes[username] = index
+            return index.query(start, end, limit, offset, cursor, newest_first)
+    
+    def iter_users(self):
+        self._refresh()
+        return iter(list(self.users.values()))
+    
+    def close(self):
+        self.flush()
+
+
+class SQLiteStorage(StorageBackend):
+    """Users and health records in indexed SQLite tables (WAL mode)"""
+    
+    def __init__(self, db_path='users_data.db'):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self._create_schema()
+    
+    def _create_schema(self):
+        """Create tables and indexes if they do not exist yet"""
+        statements = [
+            """CREATE TABLE IF NOT EXISTS users (
+                username TEXT PRIMARY KEY,
+                password TEXT NOT NULL,
+                name TEXT NOT NULL,
+                role TEXT NOT NULL,
+                family_id TEXT,
+                created_at TEXT
+            )""",
+            'CREATE INDEX IF NOT EXISTS idx_users_family ON users (family_id)',
+            """CREATE TABLE IF NOT EXISTS profiles (
+                username TEXT PRIMARY KEY REFERENCES users (username),
+                data TEXT NOT NULL
+            )""",
+            """CREATE TABLE IF NOT EXISTS other_health_data (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL REFERENCES users (username),
+                data_type TEXT NOT NULL,
+                data TEXT NOT NULL
+            )""",
+            """CREATE INDEX IF NOT EXISTS idx_other_health_data_user
+                ON other_health_data (username, data_type, id)""",
+            """CREATE TABLE IF NOT EXISTS import_checkpoints (
+                name TEXT PRIMARY KEY,
+                offset INTEGER NOT NULL
+            )"""
+        ]
+        for table in HEALTH_TABLES.values():
+            statements.append(f"""CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL REFERENCES users (username),
+                data TEXT NOT NULL
+            )""")
+            statements.append(f'CREATE INDEX IF NOT EXISTS idx_{table}_user ON {table} (username, id)')
+        
+        with self._lock:
+            for statement in statements:
+                self.conn.execute(statement)
+            self._add_report_sort_columns()
+            if 'schema_version' not in {row[1] for row in self.conn.execute('PRAGMA table_info(users)')}:
+                self.conn.execute('ALTER TABLE users ADD COLUMN schema_version INTEGER')
+    
+    def _add_report_sort_columns(self):
+        """Add and backfill the (report_ts, report_key) columns range queries sort on"""
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(reports)')}
+        if 'report_ts' not in columns:
+            with self._transaction():
+                self.conn.execute('ALTER TABLE reports ADD COLUMN report_ts REAL')
+                self.conn.execute('ALTER TABLE reports ADD COLUMN report_key TEXT')
+                rows = self.conn.execute('SELECT id, data FROM reports').fetchall()
+                self.conn.executemany(
+                    'UPDATE reports SET report_ts = ?, report_key = ? WHERE id = ?',
+                    [self._report_sort_key(record_codec.decode_report(record_codec.loads(data))) + (row_id,)
+                     for row_id, data in rows]
+                )
+        self.conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_reports_time ON reports (username, report_ts, report_key)'
+        )
+    
+    @staticmethod
+    def _report_sort_key(report):
+        """(timestamp, report id) a report is ordered by in range queries"""
+        return (record_codec.report_timestamp(report), str(report.get('id', '')))
+    
+    def _transaction(self):
+        """Context manager running its block in one IMMEDIATE transaction"""
+        return _SQLiteTransaction(self)
+    
+    def _select_section(self, username, data_type):
+        """Return one health data section of a user as a list"""
+        if data_type in HEALTH_TABLES:
+            rows = self.conn.execute(
+                f'SELECT data FROM {HEALTH_TABLES[data_type]} WHERE username = ? ORDER BY id',
+                (username,)
+            )
+        else:
+            rows = self.conn.execute(
+                'SELECT data FROM other_health_data WHERE username = ? AND data_type = ? ORDER BY id',
+                (username, data_type)
+            )
+        return record_codec.decode_section(data_type, [record_codec.loads(data) for (data,) in rows])
+    
+    def _insert_records(self, username, data_type, records):
+        """Insert health records of one section, preserving order"""
+        if data_type == 'reports':
+            self.conn.executemany(
+                'INSERT INTO reports (username, data, report_ts, report_key) VALUES (?, ?, ?, ?)',
+                [(username, record_codec.dumps(record, pretty=False)) + self._report_sort_key(record)
+                 for record in records]
+            )
+        elif data_type in HEALTH_TABLES:
+            self.conn.executemany(
+                f'INSERT INTO {HEALTH_TABLES[data_type]} (username, data) VALUES (?, ?)',
+                [(username, record_codec.dumps(record, pretty=False)) for record in records]
+            )
+        else:
+            self.conn.executemany(
+                'INSERT INTO other_health_data (username, data_type, data) VALUES (?, ?, ?)',
+                [(username, data_type, record_codec.dumps(record, pretty=False)) for record in records]
+            )
+    
+    def _replace_section(self, username, data_type, records):
+        """Replace one health data section of a user"""
+        if data_type in HEALTH_TABLES:
+            self.conn.execute(f'DELETE FROM {HEALTH_TABLES[data_type]} WHERE username = ?', (username,))
+        else:
+            self.conn.execute(
+                'DELETE FROM other_health_data WHERE username = ? AND data_type = ?',
+                (username, data_type)
+            )
+        self._insert_records(username, data_type, records)
+    
+    def has_user(self, username):
+        with self._lock:
+            row = self.conn.execute('SELECT 1 FROM users WHERE username = ?', (username,)).fetchone()
+        return row is not None
+    
+    def user_count(self):
+        with self._lock:
+            return self.conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+    
+    def _user_from_row(self, row, with_health_data=True):
+        """Assemble the AuthManager user dict from a users row"""
+        username, password, name, role, family_id, created_at, schema_version = row
+        profile = self.conn.execute(
+            'SELECT data FROM profiles WHERE username = ?', (username,)
+        ).fetchone()
+        user = {
+            'username': username,
+            'password': password,
+            'name': name,
+            'role': role,
+            'family_id': family_id,
+            'created_at': created_at,
+            'profile': record_codec.loads(profile[0]) if profile else {}
+        }
+        if schema_version is not None:
+            user['schema_version'] = schema_version
+        if with_health_data:
+            user['health_data'] = self.get_health_data(username)
+        return user
+    
+    def get_user(self, username):
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT username, password, name, role, family_id, created_at, schema_version FROM users WHERE username = ?',
+                (username,)
+            ).fetchone()
+            if row is None:
+                return None
+            return self._user_from_row(row)
+    
+    def _write_user(self, username, user):
+        """Upsert a full user record inside the caller's transaction"""
+        self.conn.execute(
+            'INSERT OR REPLACE INTO users (username, password, name, role, family_id, created_at, schema_version) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (username, user['password'], user['name'], user['role'],
+             user.get('family_id'), user.get('created_at'), user.get('schema_version'))
+        )
+        self.conn.execute(
+            'INSERT OR REPLACE INTO profiles (username, data) VALUES (?, ?)',
+            (username, record_codec.dumps(user.get('profile', {}), pretty=False))
+        )
+        for data_type, records in user.get('health_data', {}).items():
+            self._replace_section(username, data_type, records)
+    
+    def put_user(self, username, user):
+        with self._lock, self._transaction():
+            self._write_user(username, user)
+    
+    def update_profile(self, username, profile_data):
+        with self._lock, self._transaction():
+            row = self.conn.execute('SELECT data FROM profiles WHERE username = ?', (username,)).fetchone()
+            if row is None:
+                return False
+            profile = record_codec.loads(row[0])
+            profile.update(profile_data)
+            self.conn.execute(
+                'UPDATE profiles SET data = ? WHERE username = ?', (record_codec.dumps(profile, pretty=False), username)
+            )
+        return True
+    
+    def update_health_data(self, username, health_data):
+        if not self.has_user(username):
+            return False
+        with self._lock, self._transaction():
+            for data_type, records in health_data.items():
+                self._replace_section(username, data_type, records)
+        return True
+    
+    def append_health_data(self, username, data_type, data):
+        if not self.has_user(username):
+            return False
+        with self._lock, self._transaction():
+            self._insert_records(username, data_type, [data])
+        return True
+    
+    def get_health_data(self, username, data_type=None):
+        if not self.has_user(username):
+            return None
+        
+        with self._lock:
+            if data_type:
+                return self._select_section(username, data_type)
+            
+            health_data = {section: self._select_section(username, section) for section in HEALTH_TABLES}
+            extra_types = self.conn.execute(
+                'SELECT DISTINCT data_type FROM other_health_data WHERE username = ?', (username,)
+            ).fetchall()
+            for (extra_type,) in extra_types:
+                health_data[extra_type] = self._select_section(username, extra_type)
+            return health_data
+    
+    def get_family_members(self, family_id):
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT username, password, name, role, family_id, created_at, schema_version FROM users '
+                'WHERE family_id = ? ORDER BY rowid',
+                (family_id,)
+            ).fetchall()
+            return [self._user_from_row(row, with_health_data=False) for row in rows]
+    
+    def get_family_summaries(self, family_id):
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT u.username, u.name, u.role, p.data, '
+                '(SELECT COUNT(*) FROM reports r WHERE r.username = u.username), '
+                '(SELECT COUNT(*) FROM prescriptions rx WHERE rx.username = u.username) '
+                'FROM users u LEFT JOIN profiles p ON p.username = u.username '
+                'WHERE u.family_id = ? ORDER BY u.rowid',
+                (family_id,)
+            ).fetchall()
+        return [
+            _member_summary(
+                {'username': username, 'name': name, 'role': role,
+                 'profile': record_codec.loads(profile) if profile else {}},
+                reports_count,
+                prescriptions_count
+            )
+            for username, name, role, profile, reports_count, prescriptions_count in rows
+        ]
+    
+    def report_totals(self, username):
+        # Counted inside SQLite; no report is decoded
+        with self._lock:
+            reports, concerns, recommendations = self.conn.execute(
+                "SELECT COUNT(*), "
+                "COALESCE(SUM(json_array_length(data, '$.concerns')), 0), "
+                "COALESCE(SUM(json_array_length(data, '$.recommendations')), 0) "
+                "FROM reports WHERE username = ?",
+                (username,)
+            ).fetchone()
+        return {'reports': reports, 'concerns': concerns, 'recommendations': recommendations}
+    
+    def query_reports(self, username, start=None, end=None, limit=None, offset=0, cursor=None,
+                      newest_first=False):
+        if not self.has_user(username):
+            return [], None
+        
+        clauses, params = ['username = ?'], [username]
+        if start is not None:
+            clauses.append('report_ts >= ?')
+            params.append(_timestamp(start))
+        if end is not None:
+            clauses.append('report_ts < ?')
+            params.append(_timestamp(end))
+        if cursor:
+            clauses.append('(report_ts, report_key) < (?, ?)' if newest_first else '(report_ts, report_key) > (?, ?)')
+            params.extend(_decode_cursor(cursor))
+        direction = 'DESC' if newest_first else 'ASC'
+        # Fetch one extra row to learn whether another page follows
+        sql = (f'SELECT data, report_ts, report_key FROM reports WHERE {" AND ".join(clauses)} '
+               f'ORDER BY report_ts {direction}, report_key {direction} LIMIT ? OFFSET ?')
+        params.extend([-1 if limit is None else limit + 1, offset])
+        
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor((rows[-1][1], rows[-1][2]))
+        reports = record_codec.decode_section('reports', [record_codec.loads(data) for data, _, _ in rows])
+        return reports, next_cursor
+    
+    def iter_users(self):
+        with self._lock:
+            usernames = [name for (name,) in self.conn.execute('SELECT username FROM users ORDER BY rowid')]
+        for username in usernames:
+            yield self.get_user(username)
+    
+    def import_batch(self, users, records, checkpoint=None):
+        with self._lock, self._transaction():
+            for user in users:
+                self._write_user(user['username'], user)
+            for username, data_type, data in records:
+                if self.conn.execute('SELECT 1 FROM users WHERE username = ?', (username,)).fetchone():
+                    self._insert_records(username, data_type, [data])
+            if checkpoint is None:
+                return False
+            # Same transaction as the batch: a crash keeps both or neither
+            self.conn.execute(
+                'INSERT OR REPLACE INTO import_checkpoints (name, offset) VALUES (?, ?)', checkpoint
+            )
+            return True
+    
+    def import_checkpoint(self, name):
+        with self._lock:
+            row = self.conn.execute('SELECT offset FROM import_checkpoints WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+    
+    def clear_import_checkpoint(self, name):
+        with self._lock:
+            self.conn.execute('DELETE FROM import_checkpoints WHERE name = ?', (name,))
+    
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class _SQLiteTransaction:
+    """BEGIN IMMEDIATE ... COMMIT, rolled back if the block raises"""
+    
+    def __init__(self, storage):
+        self.conn = storage.conn
+    
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute('COMMIT')
+        else:
+            self.conn.execute('ROLLBACK')
+        return False
+
+
+class ShardedStorage(StorageBackend):
+    """One JSON file per user plus a small directory index, loaded lazily
+
+    Only ``index.json`` (username -> shard, family, name, role) is read on
+    start-up; a user's shard is parsed the first time it is needed and kept
+    in a bounded LRU cache so resident memory does not grow with user count.
+    """
+    
+    def __init__(self, root='users_data', max_cached_shards=64):
+        self.root = root
+        self.index_file = os.path.join(root, 'index.json')
+        self.shard_dir = os.path.join(root, 'users')
+        self.max_cached_shards = max_cached_shards
+        self._lock = threading.RLock()
+        self._shards = OrderedDict()
+        self._report_indexes = {}
+        os.makedirs(self.shard_dir, exist_ok=True)
+        self.index = self._load_index()
+        self._family_index = {}
+        for username, entry in self.index.items():
+            self._family_index.setdefault(entry.get('family_id'), []).append(username)
+    
+    def _load_index(self):
+        """Load the username -> shard directory index"""
+        if os.path.exists(self.index_file):
+            with open(self.index_file, 'rb') as f:
+                return record_codec.loads(f.read())
+        return {}
+    
+    def _shard_name(self, username):
+        """Filesystem-safe shard file name for a username"""
+        return hashlib.sha256(username.encode()).hexdigest()[:32] + '.json'
+    
+    def _load_shard(self, username):
+        """Return a user's record, reading its shard on first access"""
+        if username in self._shards:
+            self._shards.move_to_end(username)
+            return self._shards[username]
+        
+        entry = self.index.get(username)
+        if entry is None:
+            return None
+        with open(os.path.join(self.shard_dir, entry['shard']), 'rb') as f:
+            user = record_codec.decode_user(record_codec.loads(f.read()))
+        
+        self._shards[username] = user
+        while len(self._shards) > self.max_cached_shards:
+            evicted, _ = self._shards.popitem(last=False)
+            self._report_indexes.pop(evicted, None)
+        return user
+    
+    def _save_shard(self, username, user):
+        """Persist a single user's shard"""
+        _atomic_write(os.path.join(self.shard_dir, self.index[username]['shard']), record_codec.dumps(user, pretty=False))
+    
+    def has_user(self, username):
+        return username in self.index
+    
+    def user_count(self):
+        return len(self.index)
+    
+    def get_user(self, username):
+        with self._lock:
+            return self._load_shard(username)
+    
+    def _index_user(self, username, user):
+        """Point the directory index (not yet saved) at a user's shard"""
+        previous = self.index.get(username)
+        if previous and previous.get('family_id') != user.get('family_id'):
+            self._family_index[previous.get('family_id')].remove(username)
+        if not previous or previous.get('family_id') != user.get('family_id'):
+            self._family_index.setdefault(user.get('family_id'), []).append(username)
+        self.index[username] = {
+            'shard': self._shard_name(username),
+            'family_id': user.get('family_id'),
+            'name': user['name'],
+            'role': user['role']
+        }
+        self._report_indexes.pop(username, None)
+    
+    def _save_index(self):
+        """Persist the directory index"""
+        _atomic_write(self.index_file, record_codec.dumps(self.index, pretty=False))
+    
+    def put_user(self, username, user):
+        with self._lock:
+            self._index_user(username, user)
+            self._save_shard(username, user)
+            self._save_index()
+            self._shards[username] = user
+    
+    def update_profile(self, username, profile_data):
+        with self._lock:
+            user = self._load_shard(username)
+            if user is None:
+                return False
+            user['profile'].update(profile_data)
+            self._save_shard(username, user)
+        return True
+    
+    def update_health_data(self, username, health_data):
+        with self._lock:
+            user = self._load_shard(username)
+            if user is None:
+                return False
+            user['health_data'].update(health_data)
+            if 'reports' in health_data:
+                self._report_indexes.pop(username, None)
+            self._save_shard(username, user)
+        return True
+    
+    def append_health_data(self, username, data_type, data):
+        with self._lock:
+            user = self._load_shard(username)
+            if user is None:
+                return False
+            user['health_data'][data_type].append(data)
+            if data_type == 'reports' and username in self._report_indexes:
+                self._report_indexes[username].add(data)
+            self._save_shard(username, user)
+        return True
+    
+    def get_health_data(self, username, data_type=None):
+        user = self.get_user(username)
+        if user is None:
+            return None
+        
+        health_data = user.get('health_data', {})
+        if data_type:
+            return health_data.get(data_type, [])
+        return health_data
+    
+    def get_family_members(self, family_id):
+        with self._lock:
+            return [self._load_shard(username) for username in self._family_index.get(family_id, [])]
+    
+    def query_reports(self, username, start=None, end=None, limit=None, offset=0, cursor=None,
+                      newest_first=False):
+        with self._lock:
+            user = self._load_shard(username)
+            if user is None:
+                return [], None
+            index = self._report_indexes.get(username)
+            if index is None:
+                index = _ReportIndex(user['health_data'].get('reports', []))
+                self._report_indexes[username] = index
+            return index.query(start, end, limit, offset, cursor, newest_first)
+    
+    def iter_users(self):
+        for username in list(self.index):
+            yield self.get_user(username)
+    
+    def import_batch(self, users, records, checkpoint=None):
+        # Shards are written as they come, the index once for the whole batch;
+        # imported users bypass the LRU so a bulk load does not flush it
+        with self._lock:
+            batch = {}
+            for user in users:
+                self._index_user(user['username'], user)
+                self._shards.pop(user['username'], None)
+                batch[user['username']] = user
+            for username, data_type, data in records:
+                user = batch.get(username)
+                if user is None:
+                    user = self._load_shard(username)
+                    if user is None:
+                        continue
+                    batch[username] = user
+                user['health_data'].setdefault(data_type, []).append(data)
+                self._report_indexes.pop(username, None)
+            for username, user in batch.items():
+                self._save_shard(username, user)
+            self._save_index()
+        return False
+
+
+def create_storage():
+    """Build the storage backend selected by MEDIASSIST_STORAGE (json, sqlite or sharded)"""
+    engine = os.getenv('MEDIASSIST_STORAGE', 'json').lower()
+    if engine == 'sqlite':
+        return SQLiteStorage(os.getenv('MEDIASSIST_SQLITE_PATH', 'users_data.db'))
+    if engine == 'sharded':
+        return ShardedStorage(os.getenv('MEDIASSIST_SHARD_DIR', 'users_data'))
+    if engine == 'json':
+        return JSONFileStorage(os.getenv('MEDIASSIST_USERS_FILE', 'users_data.json'))
+    raise ValueError(f"Unsupported storage engine: {engine}")
+
+
+def migrate_storage(source, target):
+    """Copy every user record from one storage backend into another"""
+    migrated = 0
+    try:
+        for user in source.iter_users():
+            target.put_user(user['username'], user)
+            migrated += 1
+    finally:
+        target.close()
+    return migrated
+
+
+def migrate_json_to_sqlite(users_file='users_data.json', db_path='users_data.db'):
+    """One-shot copy of a users JSON file (and its journal) into SQLite"""
+    source = JSONFileStorage(users_file, compact_threshold=float('inf'))
+    return migrate_storage(source, SQLiteStorage(db_path))
+
+
+def migrate_json_to_shards(users_file='users_data.json', root='users_data'):
+    """One-shot split of a users JSON file (and its journal) into per-user shards"""
+    source = JSONFileStorage(users_file, compact_threshold=float('inf'))
+    return migrate_storage(source, ShardedStorage(root))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Migrate users_data.json into another storage engine')
+    parser.add_argument('users_file', nargs='?', default='users_data.json')
+    parser.add_argument('target', nargs='?', help='database file or shard directory')
+    parser.add_argument('--engine', choices=['sqlite', 'sharded'], default='sqlite')
+    args = parser.parse_args()
+    
+    if args.engine == 'sharded':
+        target = args.target or 'users_data'
+        count = migrate_json_to_shards(args.users_file, target)
+    else:
+        target = args.target or 'users_data.db'
+        count = migrate_json_to_sqlite(args.users_file, target)
+    print(f"Migrated {count} users from {args.users_file} to {target}")
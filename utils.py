@@ -1,5 +1,5 @@
 import re
-import datetime
+from id_generator import new_id
 from typing import Dict, List, Any
 
 def sanitize_text(text: str) -> str:
@@ -89,10 +89,9 @@ def extract_dates_from_text(text: str) -> List[str]:
 
 def generate_report_id() -> str:
     """
-    Generate a unique report ID for tracking
+    Generate a unique, time-sortable report ID for tracking
     """
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    return f"RPT_{timestamp}"
+    return new_id("RPT")
 
 def calculate_bmi(weight_lbs: float, height_ft: float) -> Dict[str, Any]:
     """